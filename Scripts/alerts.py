@@ -0,0 +1,107 @@
+# Threshold levels for the OLED stats display
+# Each watched value runs a small normal/warn/critical state machine with
+# hysteresis, fed once per new sample; transitions are published as events
+# to subscribers (the renderer, the log, alert hooks) instead of anyone
+# comparing values every frame
+
+import math
+from collections import namedtuple
+
+NORMAL, WARN, CRITICAL = range(3)
+STATE_NAMES = ("normal", "warn", "critical")
+
+# A state transition of one watched value (key tells disks apart, None otherwise)
+LevelEvent = namedtuple("LevelEvent", "metric key previous state value")
+
+class LevelState:
+    """normal/warn/critical state of one value with hysteresis
+
+    The bounds are precomputed tables indexed by the current state: the
+    value must reach `rise[state]` to move up a level and drop below
+    `fall[state]` (the level's threshold minus the hysteresis) to move
+    down, so a value hovering at a threshold does not flip back and forth.
+    """
+
+    __slots__ = ("rise", "fall", "state", "value")
+
+    def __init__(self, warn, critical, hysteresis, state=NORMAL):
+        self.set_bands(warn, critical, hysteresis)
+        self.state = state
+        self.value = None  # last sample
+
+    def set_bands(self, warn, critical, hysteresis):
+        """Replace the thresholds, keeping the current state"""
+        self.rise = (warn, critical, math.inf)
+        self.fall = (-math.inf, warn - hysteresis, critical - hysteresis)
+
+    def update(self, value):
+        """Move to the state for value, return True if it changed"""
+        self.value = value
+        state = previous = self.state
+        while value >= self.rise[state]:
+            state += 1
+        while value < self.fall[state]:
+            state -= 1
+        self.state = state
+        return state != previous
+
+class Alerts:
+    """The level state machines of every watched value, and who to tell when one changes
+
+    `bands` maps a metric to (warn, critical, hysteresis). Subscribers are
+    called with a LevelEvent on every transition, including the first
+    sample of a value that starts out above normal.
+    """
+
+    def __init__(self, bands):
+        self.bands = dict(bands)
+        self.machines = {}  # (metric, key) -> LevelState
+        self.subscribers = []
+        self.transitions = 0
+
+    def subscribe(self, callback):
+        """Call callback(event) on every level transition"""
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def machine(self, metric, key=None):
+        """Return the state machine of a value, creating it in the normal state"""
+        machine = self.machines.get((metric, key))
+        if machine is None:
+            machine = self.machines[(metric, key)] = LevelState(*self.bands[metric])
+        return machine
+
+    def update(self, metric, value, key=None):
+        """Feed a new sample, notify subscribers on a transition, return the state"""
+        return self._feed(metric, key, self.machine(metric, key), value)
+
+    def _feed(self, metric, key, machine, value):
+        previous = machine.state
+        if machine.update(value):
+            self.transitions += 1
+            event = LevelEvent(metric, key, previous, machine.state, value)
+            for callback in self.subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Level subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+        return machine.state
+
+    def configure(self, bands):
+        """Switch to new thresholds and re-evaluate every value's last sample against them"""
+        self.bands = dict(bands)
+        for (metric, key), machine in self.machines.items():
+            machine.set_bands(*self.bands[metric])
+            if machine.value is not None:
+                self._feed(metric, key, machine, machine.value)
+
+    def stats(self):
+        """Return the transition count and the values currently above normal"""
+        raised = {
+            metric if key is None else f"{metric}:{key}": STATE_NAMES[machine.state]
+            for (metric, key), machine in self.machines.items() if machine.state != NORMAL
+        }
+        return {"transitions": self.transitions, "raised": raised}
@@ -0,0 +1,357 @@
+# Benchmarks for the OLED stats display
+# Runs without the display attached: python3 Scripts/benchmark.py [name]
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import collectors
+
+FONTS_DIR = Path(__file__).resolve().parent.parent / "Fonts"
+
+# The shell pipelines status.py used before the native collectors
+LEGACY_COMMANDS = [
+    "cat /proc/loadavg | awk '{print $1}'",
+    "cat /sys/class/thermal/thermal_zone*/temp 2>/dev/null | head -1",
+    "free | awk 'NR==2{printf \"%.1f %.1f %.0f\", $3/1024/1024, $2/1024/1024, ($3/$2)*100}'",
+    "df -h / | awk 'NR==2{print $3, $2, $5}'",
+]
+
+def _forks_since_boot():
+    """Read the system-wide fork counter from /proc/stat"""
+    with open("/proc/stat", "rb") as f:
+        for line in f:
+            if line.startswith(b"processes "):
+                return int(line.split()[1])
+    return 0
+
+def _measure(fn, ticks):
+    """Run fn ticks times, return (forks/tick, cpu ms/tick, wall ms/tick)"""
+    forks_before = _forks_since_boot()
+    cpu_before = os.times()
+    wall_before = time.perf_counter()
+    for _ in range(ticks):
+        fn()
+    wall = time.perf_counter() - wall_before
+    cpu_after = os.times()
+    forks = _forks_since_boot() - forks_before
+    # Include children so the forked shells, awk and df are counted too
+    cpu = sum(cpu_after[:4]) - sum(cpu_before[:4])
+    return forks / ticks, cpu * 1000 / ticks, wall * 1000 / ticks
+
+def _legacy_tick():
+    for cmd in LEGACY_COMMANDS:
+        subprocess.check_output(cmd, shell=True)
+
+def _native_tick():
+    collectors.get_load()
+    collectors.get_temperature()
+    collectors.get_memory()
+    collectors.disk_usage("/")
+
+def bench_collectors(ticks=200):
+    """Compare shell pipelines against the native /proc collectors"""
+    print(f"{'path':<10}{'forks/tick':>12}{'cpu ms/tick':>14}{'wall ms/tick':>14}")
+    for name, fn in (("shell", _legacy_tick), ("native", _native_tick)):
+        forks, cpu, wall = _measure(fn, ticks)
+        print(f"{name:<10}{forks:>12.1f}{cpu:>14.3f}{wall:>14.3f}")
+
+def _reopen_tick(paths=("/proc/loadavg", "/proc/meminfo", collectors.find_thermal_zone())):
+    for path in paths:
+        if path:
+            with open(path, "rb") as f:
+                f.read()
+
+def bench_readers(ticks=5000):
+    """Compare open/read/close per tick against persistent pread readers"""
+    def pread_tick():
+        collectors._loadavg.read()
+        collectors._meminfo.read()
+        collectors._thermal.read()
+
+    for name, fn in (("reopen", _reopen_tick), ("pread", pread_tick)):
+        start = time.perf_counter()
+        for _ in range(ticks):
+            fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<10}{elapsed * 1e6 / ticks:>10.1f} us/tick")
+    for stats in collectors.reader_stats():
+        print(f"  {stats['path']}: {stats['reads']} reads, {stats['syscalls']} syscalls, "
+              f"{stats['reopens']} reopens, avg {stats['avg_us']:.1f} us, max {stats['max_us']:.1f} us")
+
+def bench_network(ticks=200):
+    """Compare polling `ip addr` against reading the netlink snapshot"""
+    import netlink
+    table = netlink.InterfaceTable().start()
+    cmd = "ip -4 -o addr show | awk '!/^[0-9]+: lo/ {print $2, $4}' | cut -d/ -f1"
+    for name, fn, n in (("ip addr", lambda: subprocess.check_output(cmd, shell=True), ticks),
+                        ("netlink", table.snapshot, ticks * 1000)):
+        forks, cpu, wall = _measure(fn, n)
+        print(f"{name:<10}{forks:>8.1f} forks/tick{wall * 1000:>12.2f} us/tick")
+    print(f"  entries: {table.snapshot()}")
+
+class _StockFrameBuffer:
+    """adafruit_framebuf's image()/pixel() for MVLSB, used when it isn't installed"""
+
+    def __init__(self, buf, width, height, rotation=0):
+        self.buf = buf
+        self.width = width
+        self.height = height
+        self.rotation = rotation
+
+    def pixel(self, x, y, color):
+        if self.rotation == 2:
+            x = self.width - x - 1
+            y = self.height - y - 1
+        index = (y >> 3) * self.width + x
+        offset = y & 0x07
+        self.buf[index] = (self.buf[index] & ~(0x01 << offset)) | ((color != 0) << offset)
+
+    def image(self, img):
+        pixels = img.load()
+        for i in range(len(self.buf)):
+            self.buf[i] = 0
+        for x in range(self.width):
+            for y in range(self.height):
+                if pixels[(x, y)]:
+                    self.pixel(x, y, 1)
+
+def _stock_framebuffer(buf, width, height, rotation):
+    try:
+        import adafruit_framebuf
+    except ImportError:
+        return _StockFrameBuffer(buf, width, height, rotation)
+    fb = adafruit_framebuf.FrameBuffer(buf, width, height, adafruit_framebuf.MVLSB)
+    fb.rotation = rotation
+    return fb
+
+def bench_packing(frames=50, width=128, height=64):
+    """Compare oled.image() packing against the numpy page packer"""
+    import random
+    from PIL import Image, ImageDraw
+    import framebuffer
+
+    if not framebuffer.NUMPY_AVAILABLE:
+        print("numpy not installed, nothing to compare")
+        return
+    rng = random.Random(0)
+    images = []
+    for _ in range(8):
+        img = Image.new("1", (width, height))
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            draw.point((rng.randrange(width), rng.randrange(height)), fill=255)
+        draw.text((rng.randrange(64), rng.randrange(48)), "12.34", fill=255)
+        images.append(img)
+
+    for rotation in (0, 2):
+        stock_buf = bytearray(width * height // 8)
+        fast_buf = bytearray(width * height // 8)
+        stock = _stock_framebuffer(stock_buf, width, height, rotation)
+        packer = framebuffer.PagePacker(width, height, rotation)
+
+        identical = True
+        for img in images:
+            stock.image(img)
+            packer.pack_into(img, fast_buf)
+            identical &= stock_buf == fast_buf
+
+        timings = []
+        for fn in (lambda img: stock.image(img), lambda img: packer.pack_into(img, fast_buf)):
+            start = time.perf_counter()
+            for i in range(frames):
+                fn(images[i % len(images)])
+            timings.append((time.perf_counter() - start) * 1e6 / frames)
+        print(f"rotation {rotation}: stock {timings[0]:>9.1f} us/frame   numpy {timings[1]:>7.1f} us/frame"
+              f"   byte-identical: {identical}")
+
+def bench_partial(frames=60, width=128, height=64):
+    """Count I2C bytes for full frames vs dirty-page partial updates"""
+    from PIL import Image, ImageDraw, ImageFont
+    import framebuffer
+
+    font = ImageFont.truetype(str(FONTS_DIR / "PixelOperator.ttf"), 16)
+    img = Image.new("1", (width, height))
+    draw = ImageDraw.Draw(img)
+    buf = bytearray(width * height // 8)
+    stock = _stock_framebuffer(buf, width, height, 0)
+    updater = framebuffer.PartialUpdater(width, height, lambda cmd: None, lambda data: None)
+    for i in range(frames):
+        # A typical status screen where only the load digits tick over
+        draw.rectangle((0, 0, width, height), outline=0, fill=0)
+        draw.text((0, 0), "raspberrypi", font=font, fill=255)
+        draw.text((16, 16), f"{0.15 + (i // 2) * 0.01:.2f}", font=font, fill=255)
+        draw.text((90, 16), "45C", font=font, fill=255)
+        draw.text((16, 32), "0.4/3.7GB 11%", font=font, fill=255)
+        draw.text((16, 48), "4/29GB 15%", font=font, fill=255)
+        stock.image(img)
+        updater.show(buf)
+    stats = updater.stats()
+    for key, value in stats.items():
+        print(f"  {key:<18}{value:>10.1f}" if isinstance(value, float) else f"  {key:<18}{value:>10}")
+
+def bench_glyphs(frames=500):
+    """Compare draw.text() against the glyph bitmap cache for one status frame"""
+    from PIL import Image, ImageDraw, ImageFont
+    import glyphs
+
+    font = ImageFont.truetype(str(FONTS_DIR / "PixelOperator.ttf"), 16)
+    icon_font = ImageFont.truetype(str(FONTS_DIR / "la-solid-900.ttf"), 14)
+    cache = glyphs.GlyphCache()
+    # (x, y, text, font) for a typical frame: 4 icons + 5 text fields
+    frame = [(0, 0, "\uf108", icon_font), (16, 0, "raspberrypi", font),
+             (0, 16, "\uf0e7", icon_font), (16, 16, "0.15", font),
+             (75, 16, "\uf2c9", icon_font), (91, 16, "45C", font),
+             (0, 32, "\uf0ae", icon_font), (16, 32, "0.4/3.7GB 11%", font),
+             (0, 48, "\uf0a0", icon_font), (16, 48, "4/29GB 15%", font)]
+
+    def draw_text_frame(img, draw):
+        for x, y, text, f in frame:
+            draw.text((x, y), text, font=f, fill=255)
+
+    def cached_frame(img, draw):
+        for x, y, text, f in frame:
+            cache.draw_text(img, draw, (x, y), text, f)
+
+    images = []
+    for name, fn in (("draw.text", draw_text_frame), ("cache", cached_frame)):
+        img = Image.new("1", (128, 64))
+        draw = ImageDraw.Draw(img)
+        start = time.perf_counter()
+        for _ in range(frames):
+            draw.rectangle((0, 0, 128, 64), outline=0, fill=0)
+            fn(img, draw)
+        elapsed = time.perf_counter() - start
+        images.append(img.tobytes())
+        print(f"{name:<10}{elapsed * 1e6 / frames:>10.1f} us/frame")
+    print(f"  identical: {images[0] == images[1]}  {cache.stats()}")
+
+def _split_cpu_sample():
+    """Read /proc/stat the usual way: whole file, readlines() and split()"""
+    with open("/proc/stat") as f:
+        return [list(map(int, line.split()[1:9])) for line in f if line.startswith("cpu")]
+
+def bench_cpu(samples=5000):
+    """Compare split()-based /proc/stat parsing against the preallocated CpuStats sampler"""
+    cpu = collectors.CpuStats()
+    for name, fn in (("split", _split_cpu_sample), ("cpustats", cpu.sample)):
+        start = time.perf_counter()
+        for _ in range(samples):
+            fn()
+        per_sample = (time.perf_counter() - start) / samples
+        # Share of a 4 Hz (250 ms) tick spent sampling
+        print(f"{name:<10}{per_sample * 1e6:>10.1f} us/sample  {per_sample / 0.25 * 100:>7.3f}% of a 4 Hz tick")
+    print(f"  {cpu.ncpu} cores, {cpu.reader.stats()['syscalls'] / max(cpu.samples, 1):.1f} syscalls/sample")
+
+def bench_throughput(samples=5000):
+    """Time one /proc/net/dev throughput sample"""
+    import netlink
+    rates = collectors.NetThroughput(netlink.classify_interface)
+    start = time.perf_counter()
+    for _ in range(samples):
+        rates.sample()
+    elapsed = time.perf_counter() - start
+    print(f"{'netdev':<10}{elapsed * 1e6 / samples:>10.1f} us/sample")
+    print(f"  interfaces shown: {[rate.name for rate in rates.sample()]}")
+
+def bench_history(frames=2000, width=128, height=64):
+    """Time ring buffer appends and a three-sparkline graph screen, with and without numpy"""
+    import random
+    import framebuffer
+    import history
+    from PIL import Image, ImageDraw
+    metrics = history.MetricHistory(("load", "temp", "memory"), size=width)
+    start = time.perf_counter()
+    for _ in range(frames):
+        for name in ("load", "temp", "memory"):
+            metrics.record(name, random.random() * 100)
+    elapsed = time.perf_counter() - start
+    print(f"{'append':<10}{elapsed * 1e6 / (frames * 3):>10.2f} us/sample  ({metrics.nbytes} bytes total)")
+    image = Image.new("1", (width, height))
+    draw = ImageDraw.Draw(image)
+    framebuffer.load_numpy()
+    numpy_module = framebuffer.np
+    for name, module in (("lines", None), ("numpy", numpy_module)):
+        if name == "numpy" and module is None:
+            print("numpy     not installed, skipped")
+            continue
+        framebuffer.np = module
+        start = time.perf_counter()
+        for _ in range(frames):
+            for index, metric in enumerate(("load", "temp", "memory")):
+                history.draw_sparkline(image, draw, (16, index * 21 + 1, width - 16, 19),
+                                       metrics[metric].values(), 0.0, 100.0)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<10}{elapsed * 1e6 / frames:>10.1f} us/frame")
+    framebuffer.np = numpy_module
+
+def bench_exporter(scrapes=2000):
+    """Time rendering one scrape of a typical metric set (4 cores, 2 volumes, 2 interfaces)"""
+    import exporter
+    collectors_names = ("network", "load", "temp", "memory", "disk", "cpu", "throughput", "history")
+
+    def families():
+        yield "load1", "gauge", "1-minute load average", [((), 0.42)]
+        yield "temperature_celsius", "gauge", "CPU temperature", [((), 51.3)]
+        yield "memory_used_percent", "gauge", "Memory in use", [((), 23.0)]
+        yield ("filesystem_used_percent", "gauge", "Volume usage",
+               [((("volume", label),), 42.0) for label in ("/", "NVMe")])
+        yield ("network_receive_bytes_per_second", "gauge", "Smoothed receive rate",
+               [((("interface", name), ("kind", kind)), 12345.6) for name, kind in (("eth0", "lan"), ("wlan0", "wifi"))])
+        yield ("cpu_core_busy_percent", "gauge", "Per-core busy share",
+               [((("core", str(index)),), 12.5) for index in range(4)])
+        for family in ("runs_total", "errors_total", "timeouts_total"):
+            yield (f"collector_{family}", "counter", "Collector runs",
+                   [((("collector", name),), 1234) for name in collectors_names])
+
+    start = time.perf_counter()
+    for _ in range(scrapes):
+        text = exporter.render(families(), "oled_status_")
+    elapsed = time.perf_counter() - start
+    print(f"{'render':<10}{elapsed * 1e6 / scrapes:>10.1f} us/scrape  ({len(text)} bytes)")
+
+def bench_instrumentation(frames=20000, refresh=1.0):
+    """Time the per-frame instrumentation of the render loop against the refresh interval
+
+    A frame records layout, rasterize, submit, pack, transfer and, at the
+    default intervals, about six collector runs, and reads the clock for
+    four redrawn widgets.
+    """
+    from profiling import StageTimings
+    timings = StageTimings()
+    stages = ("layout", "rasterize", "submit", "pack", "transfer",
+              "collect_network", "collect_load", "collect_temp", "collect_memory", "collect_throughput",
+              "collect_history")
+    clock = time.monotonic
+    start = time.perf_counter()
+    for frame in range(frames):
+        for _ in range(8):
+            clock()
+        for stage in stages:
+            timings.record(stage, 0.0003)
+    elapsed = time.perf_counter() - start
+    per_frame = elapsed / frames
+    print(f"{'record':<10}{per_frame * 1e6:>10.1f} us/frame  "
+          f"({per_frame / refresh * 100:.4f}% of a {refresh:g}s refresh)")
+
+BENCHMARKS = {
+    "collectors": bench_collectors,
+    "readers": bench_readers,
+    "network": bench_network,
+    "packing": bench_packing,
+    "partial": bench_partial,
+    "glyphs": bench_glyphs,
+    "cpu": bench_cpu,
+    "throughput": bench_throughput,
+    "history": bench_history,
+    "exporter": bench_exporter,
+    "instrumentation": bench_instrumentation,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -0,0 +1,541 @@
+# System metric collectors for the OLED stats display
+# Reads /proc, /sys and statvfs directly instead of forking shell pipelines
+
+import asyncio
+import glob
+import math
+import os
+import select
+import time
+from array import array
+from collections import namedtuple
+
+THERMAL_GLOB = "/sys/class/thermal/thermal_zone*/temp"
+
+def find_thermal_zone():
+    """Return the first thermal zone temp file (same one `head -1` picked)"""
+    zones = sorted(glob.glob(THERMAL_GLOB))
+    return zones[0] if zones else None
+
+class ProcReader:
+    """Keep a /proc or /sys pseudo-file open and re-read it with pread
+
+    The file is opened once and read into a preallocated bytearray, so a
+    tick costs a single syscall. If the file goes away (e.g. a thermal
+    zone is hot-unplugged) it is reopened on the next read, re-resolving
+    the path through `resolve` when one is given.
+    """
+
+    # Seconds to wait before retrying a file that could not be opened
+    RETRY_INTERVAL = 5.0
+
+    def __init__(self, path, size=4096, resolve=None, grow=True):
+        self.path = path
+        self.resolve = resolve
+        # With grow=False only the first `size` bytes are read (e.g. the
+        # cpu lines at the top of /proc/stat, skipping the long intr line)
+        self.grow = grow
+        self._retry_at = 0.0
+        self.buf = bytearray(size)
+        self._views = [memoryview(self.buf)]
+        self.fd = -1
+        # Counters for confirming the syscall savings on the device
+        self.reads = 0
+        self.syscalls = 0
+        self.reopens = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def _open(self):
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        if self.resolve is not None:
+            self.path = self.resolve()
+        if self.path is None:
+            self._retry_at = now + self.RETRY_INTERVAL
+            return False
+        try:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self.fd = -1
+            self._retry_at = now + self.RETRY_INTERVAL
+            return False
+        finally:
+            self.syscalls += 1
+        return True
+
+    def close(self):
+        """Close the file descriptor, the next read reopens it"""
+        if self.fd >= 0:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.syscalls += 1
+            self.fd = -1
+
+    def read(self):
+        """Re-read the file into self.buf, return the number of valid bytes"""
+        start = time.perf_counter_ns()
+        n = 0
+        retried = False
+        while True:
+            if self.fd < 0:
+                if retried:
+                    self.reopens += 1
+                if not self._open():
+                    break
+            try:
+                n = os.preadv(self.fd, self._views, 0)
+                self.syscalls += 1
+            except OSError:
+                # File vanished or device went away - reopen once and retry
+                self.syscalls += 1
+                self.close()
+                n = 0
+                if retried:
+                    break
+                retried = True
+                continue
+            if n == len(self.buf) and self.grow:
+                # Buffer too small: grow it and read again until the whole file fits
+                self.buf = bytearray(len(self.buf) * 2)
+                self._views = [memoryview(self.buf)]
+                continue
+            break
+        if n == 0:
+            self.errors += 1
+        elapsed = time.perf_counter_ns() - start
+        self.reads += 1
+        self.total_ns += elapsed
+        if elapsed > self.max_ns:
+            self.max_ns = elapsed
+        return n
+
+    def stats(self):
+        """Return the reader's syscall and latency counters"""
+        return {
+            "path": self.path,
+            "reads": self.reads,
+            "syscalls": self.syscalls,
+            "reopens": self.reopens,
+            "errors": self.errors,
+            "avg_us": self.total_ns / self.reads / 1000 if self.reads else 0.0,
+            "max_us": self.max_ns / 1000,
+        }
+
+# Byte values used by the parsers below
+_SPACE = b" "[0]
+_DOT = b"."[0]
+_ZERO = b"0"[0]
+_NINE = b"9"[0]
+_MINUS = b"-"[0]
+
+def parse_int(buf, pos, end):
+    """Parse an integer from buf[pos:end] without slicing, return (value, next_pos)
+
+    Leading spaces are skipped; parsing stops at the first non-digit.
+    """
+    while pos < end and buf[pos] == _SPACE:
+        pos += 1
+    negative = pos < end and buf[pos] == _MINUS
+    if negative:
+        pos += 1
+    value = 0
+    while pos < end:
+        c = buf[pos]
+        if c < _ZERO or c > _NINE:
+            break
+        value = value * 10 + (c - _ZERO)
+        pos += 1
+    return (-value if negative else value), pos
+
+def parse_fixed(buf, pos, end):
+    """Parse a decimal like b"0.23" from buf, return (value, next_pos)"""
+    whole, pos = parse_int(buf, pos, end)
+    if pos < end and buf[pos] == _DOT:
+        pos += 1
+        start = pos
+        frac, pos = parse_int(buf, pos, end)
+        return whole + frac / (10 ** (pos - start)), pos
+    return float(whole), pos
+
+def parse_field(buf, n, key):
+    """Find `key` in buf[:n] and parse the integer that follows it"""
+    pos = buf.find(key, 0, n)
+    if pos < 0:
+        raise KeyError(key)
+    return parse_int(buf, pos + len(key), n)[0]
+
+# Persistent readers, opened on first use
+_loadavg = ProcReader("/proc/loadavg", size=128)
+_meminfo = ProcReader("/proc/meminfo", size=4096)
+_thermal = ProcReader(None, size=32, resolve=find_thermal_zone)
+
+def reader_stats():
+    """Return the counters of every persistent reader"""
+    return [reader.stats() for reader in (_loadavg, _thermal, _meminfo)]
+
+def get_load():
+    """Get the 1-minute load average from /proc/loadavg"""
+    n = _loadavg.read()
+    if not n:
+        return 0.0
+    return parse_fixed(_loadavg.buf, 0, n)[0]
+
+def get_temperature():
+    """Get the CPU temperature in degrees C"""
+    n = _thermal.read()
+    if not n:
+        return 0.0
+    return parse_int(_thermal.buf, 0, n)[0] / 1000
+
+def get_memory():
+    """Get memory usage as (used_bytes, total_bytes, percent)
+
+    Matches `free`: used = MemTotal - MemAvailable.
+    """
+    n = _meminfo.read()
+    try:
+        total_kb = parse_field(_meminfo.buf, n, b"MemTotal:")
+        used_kb = total_kb - parse_field(_meminfo.buf, n, b"MemAvailable:")
+    except KeyError:
+        return 0, 0, 0.0
+    percent = round(used_kb / total_kb * 100) if total_kb else 0
+    return used_kb * 1024, total_kb * 1024, float(percent)
+
+# /proc/stat cpu fields used: user nice system idle iowait irq softirq steal
+CPU_FIELDS = 8
+_C = b"c"[0]
+_NEWLINE = b"\n"[0]
+
+class CpuStats:
+    """Total and per-core CPU utilization from /proc/stat deltas
+
+    The previous and current jiffies snapshots live in two preallocated
+    array('Q') buffers that are swapped each sample, and the results are
+    written into preallocated array('d') buffers, so sampling allocates
+    no lists. Only the head of /proc/stat (the cpu lines) is read.
+    After `sample()`: `total`, `iowait` and `steal` are percentages of
+    all CPU time, `cores[i]` is core i's busy percentage (offline cores,
+    which have no line in /proc/stat, read 0, and so does a core's first
+    sample after it comes back online).
+    """
+
+    def __init__(self, ncpu=None):
+        self.ncpu = ncpu or os.cpu_count() or 1
+        rows = self.ncpu + 1
+        # ~100 bytes per cpu line is plenty; the rest of the file is skipped
+        self.reader = ProcReader("/proc/stat", size=128 * rows + 256, grow=False)
+        self.prev = array("Q", bytes(8 * rows * CPU_FIELDS))
+        self.cur = array("Q", bytes(8 * rows * CPU_FIELDS))
+        # 1 for each row present in the matching snapshot, swapped along with it
+        self.prev_seen = bytearray(rows)
+        self.seen = bytearray(rows)
+        self._unseen = bytes(rows)
+        self.cores = array("d", bytes(8 * self.ncpu))
+        self.total = 0.0
+        self.iowait = 0.0
+        self.steal = 0.0
+        self.samples = 0
+
+    def _parse(self, buf, n):
+        """Parse the cpu lines into self.cur (row 0 = aggregate, row i+1 = cpu i)"""
+        cur = self.cur
+        seen = self.seen
+        seen[:] = self._unseen
+        rows = self.ncpu + 1
+        pos = 0
+        while pos + 3 < n and buf[pos] == _C and buf[pos + 1:pos + 3] == b"pu":
+            pos += 3
+            if buf[pos] == _SPACE:
+                row = 0
+            else:
+                core, pos = parse_int(buf, pos, n)
+                row = core + 1
+            if row < rows:
+                seen[row] = 1
+                base = row * CPU_FIELDS
+                for field in range(CPU_FIELDS):
+                    cur[base + field], pos = parse_int(buf, pos, n)
+            while pos < n and buf[pos] != _NEWLINE:
+                pos += 1
+            pos += 1
+
+    def sample(self):
+        """Read /proc/stat and update the utilization figures, return self"""
+        n = self.reader.read()
+        if not n:
+            return self
+        self._parse(self.reader.buf, n)
+        prev, cur = self.prev, self.cur
+        prev_seen, seen = self.prev_seen, self.seen
+        if self.samples:
+            for row in range(self.ncpu + 1):
+                base = row * CPU_FIELDS
+                if not (seen[row] and prev_seen[row]):
+                    # Offline (stale counters left in the swapped buffer) or no baseline yet
+                    if row:
+                        self.cores[row - 1] = 0.0
+                    continue
+                total = 0
+                for field in range(CPU_FIELDS):
+                    total += cur[base + field] - prev[base + field]
+                # idle + iowait count as not busy
+                idle = (cur[base + 3] - prev[base + 3]) + (cur[base + 4] - prev[base + 4])
+                busy = 100.0 * (total - idle) / total if total > 0 else 0.0
+                if row:
+                    self.cores[row - 1] = busy
+                else:
+                    self.total = busy
+                    if total > 0:
+                        self.iowait = 100.0 * (cur[base + 4] - prev[base + 4]) / total
+                        self.steal = 100.0 * (cur[base + 7] - prev[base + 7]) / total
+        # Swap snapshots instead of copying
+        self.prev, self.cur = cur, prev
+        self.prev_seen, self.seen = seen, prev_seen
+        self.samples += 1
+        return self
+
+# Per-interface throughput (bytes and packets per second, smoothed)
+NetRate = namedtuple("NetRate", "kind name rx_bytes tx_bytes rx_packets tx_packets")
+
+# Drivers that still keep 32-bit counters wrap at this value
+COUNTER_WRAP = 1 << 32
+
+def counter_delta(previous, current):
+    """Return how far a byte/packet counter advanced, allowing for wraps and resets"""
+    if current >= previous:
+        return current - previous
+    if previous >= COUNTER_WRAP // 2 and previous < COUNTER_WRAP:
+        # A 32-bit counter rolled over
+        return current + COUNTER_WRAP - previous
+    # Counters were reset (driver reload): count what accumulated since
+    return current
+
+class _Interface:
+    """Counters and smoothed rates of one interface"""
+
+    __slots__ = ("kind", "name", "counters", "rates", "stamp", "active")
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        # rx_bytes, tx_bytes, rx_packets, tx_packets
+        self.counters = array("Q", bytes(32))
+        self.rates = array("d", bytes(32))
+        self.stamp = None
+        self.active = False
+
+class NetThroughput:
+    """RX/TX byte and packet rates of the lan/wifi interfaces from /proc/net/dev
+
+    The whole file is read with one pread per sample and parsed in place.
+    Rates come from deltas between monotonic timestamps and are smoothed
+    with an EWMA whose weight follows the actual sample spacing, so an
+    irregular interval does not skew them. `classify` maps an interface
+    name to "lan", "wifi" or None (skipped). Interfaces that drop out of
+    the file (an unplugged USB NIC) are forgotten, and start over from
+    fresh counters if they come back.
+    """
+
+    def __init__(self, classify, smoothing=3.0, clock=time.monotonic):
+        self.classify = classify
+        self.smoothing = smoothing
+        self.clock = clock
+        self.reader = ProcReader("/proc/net/dev", size=4096)
+        # Interface name (bytes) -> _Interface, or None if not shown
+        self.interfaces = {}
+        self.samples = 0
+
+    def _interface(self, name):
+        entry = self.interfaces.get(name)
+        if entry is None and name not in self.interfaces:
+            text = name.decode(errors="replace")
+            kind = self.classify(text)
+            entry = self.interfaces[name] = _Interface(kind, text) if kind else None
+        return entry
+
+    def _update(self, entry, pos, buf, n, now):
+        """Parse one interface's counters at buf[pos:] and fold them into its rates"""
+        rx_bytes, pos = parse_int(buf, pos, n)
+        rx_packets, pos = parse_int(buf, pos, n)
+        for _ in range(6):
+            _, pos = parse_int(buf, pos, n)
+        tx_bytes, pos = parse_int(buf, pos, n)
+        tx_packets, pos = parse_int(buf, pos, n)
+        counters = entry.counters
+        rates = entry.rates
+        if entry.stamp is not None:
+            elapsed = now - entry.stamp
+            if elapsed <= 0:
+                return
+            # EWMA weight for this interval (time constant = smoothing)
+            weight = 1.0 - math.exp(-elapsed / self.smoothing) if self.smoothing > 0 else 1.0
+            for i, value in enumerate((rx_bytes, tx_bytes, rx_packets, tx_packets)):
+                rate = counter_delta(counters[i], value) / elapsed
+                rates[i] += weight * (rate - rates[i])
+                counters[i] = value
+        else:
+            counters[0], counters[1], counters[2], counters[3] = rx_bytes, tx_bytes, rx_packets, tx_packets
+        entry.stamp = now
+        entry.active = entry.active or rx_bytes > 0 or tx_bytes > 0
+
+    def sample(self):
+        """Read /proc/net/dev, update the rates and return a tuple of NetRate"""
+        n = self.reader.read()
+        if not n:
+            return ()
+        now = self.clock()
+        buf = self.reader.buf
+        # Skip the two header lines
+        pos = buf.find(b"\n", buf.find(b"\n", 0, n) + 1, n) + 1
+        seen = set()
+        while 0 < pos < n:
+            colon = buf.find(b":", pos, n)
+            if colon < 0:
+                break
+            start = pos
+            while buf[start] == _SPACE:
+                start += 1
+            name = bytes(buf[start:colon])
+            seen.add(name)
+            entry = self._interface(name)
+            if entry is not None:
+                self._update(entry, colon + 1, buf, n, now)
+            pos = buf.find(b"\n", colon, n) + 1
+        if len(seen) != len(self.interfaces):
+            for name in [name for name in self.interfaces if name not in seen]:
+                del self.interfaces[name]
+        self.samples += 1
+        return tuple(
+            NetRate(entry.kind, entry.name, *entry.rates)
+            for entry in self.interfaces.values()
+            if entry is not None and entry.active
+        )
+
+GIB = 1024 ** 3
+
+def human_gb(num_bytes):
+    """Format a byte count in GiB the way `df -h` does (rounded up)"""
+    gb = num_bytes / GIB
+    if gb < 10:
+        return f"{math.ceil(gb * 10) / 10:.1f}"
+    return f"{math.ceil(gb)}"
+
+# One volume's usage; sizes are in bytes (human_gb() formats them like `df -h`)
+DiskUsage = namedtuple("DiskUsage", "label used total free percent")
+
+def disk_usage(path, label=None):
+    """Get usage of the filesystem mounted at path (raises OSError)"""
+    st = os.statvfs(path)
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    avail = st.f_bavail * st.f_frsize
+    total = st.f_blocks * st.f_frsize
+    # df reports Use% against used + available (reserved blocks excluded)
+    percent = math.ceil(used * 100 / (used + avail)) if used + avail else 0
+    return DiskUsage(label or path, used, total, avail, float(percent))
+
+def _unescape_mount(field):
+    """Undo mountinfo's octal escapes (\\040 for space etc.)"""
+    if b"\\" not in field:
+        return field.decode("utf-8", "replace")
+    return field.decode("unicode_escape").encode("latin-1").decode("utf-8", "replace")
+
+def parse_mountinfo(data):
+    """Parse /proc/self/mountinfo into {mount_point: (fstype, source)}"""
+    mounts = {}
+    for line in data.splitlines():
+        fields = line.split(b" ")
+        try:
+            sep = fields.index(b"-", 6)
+            mounts[_unescape_mount(fields[4])] = (fields[sep + 1].decode(), _unescape_mount(fields[sep + 2]))
+        except (ValueError, IndexError):
+            continue
+    return mounts
+
+class MountTable:
+    """Mount points from /proc/self/mountinfo, re-read only when they change
+
+    The kernel flags the open mountinfo file with POLLPRI whenever the
+    mount table changes, so a zero-timeout poll per collection is all it
+    costs to know whether a USB drive or NFS share came or went.
+    """
+
+    def __init__(self, path="/proc/self/mountinfo"):
+        self.reader = ProcReader(path, size=16384)
+        self.poller = select.poll()
+        self.mounts = {}
+        self.reloads = 0
+
+    def refresh(self):
+        """Re-read the table if it changed (or was never read), return the mounts"""
+        fd = self.reader.fd
+        if fd < 0 or self.poller.poll(0):
+            n = self.reader.read()
+            if self.reader.fd != fd:
+                # First read or the file was reopened: watch the new descriptor
+                if fd >= 0:
+                    self.poller.unregister(fd)
+                if self.reader.fd >= 0:
+                    self.poller.register(self.reader.fd, select.POLLPRI)
+            self.mounts = parse_mountinfo(bytes(self.reader.buf[:n]))
+            self.reloads += 1
+        return self.mounts
+
+class DiskCollector:
+    """Usage of several mount points, each statvfs'd off the event loop
+
+    statvfs on a hung network mount can block forever, so every mount is
+    queried on the executor with its own timeout, and a mount whose last
+    call is still stuck is not queried again until it returns. Results
+    are cached and shown for up to `ttl` seconds after the last good one;
+    mount points that are not currently mounted are left out.
+    """
+
+    def __init__(self, volumes, executor, timeout=2.0, ttl=300.0, mount_table=None, clock=time.monotonic):
+        # volumes: [(mount_point, label)]
+        self.volumes = volumes
+        self.executor = executor
+        self.timeout = timeout
+        self.ttl = ttl
+        self.mount_table = mount_table or MountTable()
+        self.clock = clock
+        self.cache = {}     # mount_point -> (DiskUsage, timestamp)
+        self.pending = {}   # mount_point -> executor future still running
+        self.timeouts = 0
+
+    async def _query(self, path, label):
+        future = self.pending.get(path)
+        if future is None or future.done():
+            loop = asyncio.get_running_loop()
+            future = self.pending[path] = loop.run_in_executor(self.executor, disk_usage, path, label)
+        try:
+            usage = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return
+        except OSError:
+            usage = None
+        del self.pending[path]
+        if usage is not None:
+            self.cache[path] = (usage, self.clock())
+
+    async def collect(self):
+        """Refresh every mounted volume, return a tuple of DiskUsage"""
+        mounts = self.mount_table.refresh()
+        mounted = [(path, label) for path, label in self.volumes if path in mounts]
+        await asyncio.gather(*(self._query(path, label) for path, label in mounted))
+        now = self.clock()
+        results = []
+        for path, _ in mounted:
+            cached = self.cache.get(path)
+            if cached is not None and now - cached[1] <= self.ttl:
+                results.append(cached[0])
+        return tuple(results)
+
+    def stuck(self):
+        """Return the mount points whose statvfs never returned"""
+        return [path for path, future in self.pending.items() if not future.done()]
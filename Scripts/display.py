@@ -0,0 +1,320 @@
+# Display backends for the OLED stats display
+# The SSD1306 over I2C is one implementation; the virtual backend records
+# frames in memory or as image files so everything runs without a Pi
+
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from PIL import Image
+
+import framebuffer
+
+class DisplayBackend:
+    """Interface every display backend implements
+
+    Backends take a PIL "1" image the size of the display in `show()`,
+    optionally with the (x0, y0, x1, y1) rectangle that is the only part
+    changed since the previous frame. `clear()` blanks the panel,
+    `invalidate()` makes the next frame go out in full (after a failed
+    transfer) and `stats()` returns transfer counters.
+    `show()` leaves the time it spent packing and transferring the last
+    frame in `last_pack` and `last_transfer` (seconds).
+    """
+
+    name = "base"
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.last_pack = 0.0
+        self.last_transfer = 0.0
+
+    def show(self, image, dirty=None):
+        raise NotImplementedError
+
+    def clear(self):
+        self.show(Image.new("1", (self.width, self.height)))
+
+    def invalidate(self):
+        pass
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+class SSD1306Backend(DisplayBackend):
+    """SSD1306 panel over I2C with a GPIO reset pin"""
+
+    name = "ssd1306"
+
+    # The SSD1306 needs RES# low for at least 3 us and is ready right after
+    RESET_PULSE = 0.001
+
+    def __init__(self, width, height, i2c_address=0x3C, rotation=0, reset_gpio=4, **_):
+        # Hardware libraries are only needed (and only imported) for this backend
+        import board
+        import gpiozero
+        import adafruit_ssd1306
+
+        super().__init__(width, height)
+        self.rotation = rotation
+
+        # Use gpiozero to control the reset pin
+        self.reset_pin = gpiozero.OutputDevice(reset_gpio, active_high=False)
+
+        # Use I2C for communication
+        i2c = board.I2C()
+
+        # Manually reset the display
+        self.reset_pin.on()
+        time.sleep(self.RESET_PULSE)
+        self.reset_pin.off()
+        time.sleep(self.RESET_PULSE)
+        self.reset_pin.on()
+
+        # Create the OLED display object
+        self.oled = adafruit_ssd1306.SSD1306_I2C(width, height, i2c, addr=i2c_address)
+
+        # Set display rotation
+        if rotation == 2:
+            try:
+                self.oled.rotate(2)
+            except AttributeError:
+                self.oled.rotation = 2
+
+        # Pack frames with numpy when available instead of the driver's per-pixel
+        # loop; until the background import finishes, oled.image() is used
+        framebuffer.preload_numpy()
+        self.packer = None
+        self._packer_checked = False
+
+        # Only send the pages/columns that changed since the last frame
+        self.updater = framebuffer.make_partial_updater(self.oled)
+
+    def show(self, image, dirty=None):
+        """Copy the image into the display buffer and send it to the panel"""
+        oled = self.oled
+        start = time.perf_counter()
+        if not self._packer_checked and framebuffer.np is not None:
+            self.packer = framebuffer.make_packer(oled)
+            self._packer_checked = True
+        if self.packer is not None:
+            self.packer.pack_into(image, oled.buf)
+        else:
+            oled.image(image)
+        packed = time.perf_counter()
+        if self.updater is not None:
+            # Map the rectangle the way the image was flipped into the buffer: by
+            # oled.rotation, which stays 0 when the panel rotates in hardware
+            rotation = getattr(oled, "rotation", 0)
+            window = framebuffer.dirty_window(dirty, self.width, self.height, rotation) if dirty else None
+            self.updater.show(oled.buf, window)
+        else:
+            oled.show()
+        self.last_pack = packed - start
+        self.last_transfer = time.perf_counter() - packed
+
+    def clear(self):
+        self.oled.fill(0)
+        self.oled.show()
+        self.invalidate()
+
+    def invalidate(self):
+        if self.updater is not None:
+            self.updater.invalidate()
+
+    def stats(self):
+        return self.updater.stats() if self.updater is not None else {}
+
+class VirtualBackend(DisplayBackend):
+    """Hardware-free display that records frames in memory and/or to files
+
+    The last `keep` frames are held in `frames`. With `output` set, every
+    frame is also written there as PNG or PBM, cycling through
+    `max_files` file names so a long run does not fill the disk. Frames
+    are still page-packed and diffed so transfer stats match the panel.
+    """
+
+    name = "virtual"
+
+    def __init__(self, width, height, rotation=0, output=None, image_format="png",
+                 keep=60, max_files=100, **_):
+        super().__init__(width, height)
+        self.frames = deque(maxlen=keep)
+        self.output = Path(output) if output else None
+        self.image_format = image_format.lower()
+        self.max_files = max_files
+        self.frame_count = 0
+        if self.output is not None:
+            self.output.mkdir(parents=True, exist_ok=True)
+        self.buf = bytearray(width * height // 8)
+        self.rotation = rotation
+        # Frames are only packed (for transfer stats) once numpy has loaded
+        framebuffer.preload_numpy()
+        self.packer = None
+        self.updater = framebuffer.PartialUpdater(width, height, lambda cmd: None, lambda data: None)
+
+    def show(self, image, dirty=None):
+        start = time.perf_counter()
+        frame = image.copy()
+        self.frames.append(frame)
+        if self.packer is None and framebuffer.np is not None:
+            self.packer = framebuffer.PagePacker(self.width, self.height, self.rotation)
+        if self.packer is not None:
+            self.packer.pack_into(frame, self.buf)
+        packed = time.perf_counter()
+        if self.packer is not None:
+            window = framebuffer.dirty_window(dirty, self.width, self.height, self.rotation) if dirty else None
+            self.updater.show(self.buf, window)
+        if self.output is not None:
+            index = self.frame_count % self.max_files if self.max_files else self.frame_count
+            path = self.output / f"frame-{index:06d}.{self.image_format}"
+            # PIL writes mode "1" images as binary PBM (P4) through its PPM plugin
+            frame.save(path, format="PPM" if self.image_format == "pbm" else "PNG")
+        self.frame_count += 1
+        self.last_pack = packed - start
+        self.last_transfer = time.perf_counter() - packed
+
+    def invalidate(self):
+        self.updater.invalidate()
+
+    def stats(self):
+        stats = self.updater.stats() if self.packer is not None else {}
+        stats["frames_recorded"] = self.frame_count
+        return stats
+
+def union_rect(a, b):
+    """Return the rectangle covering a and b (None, meaning everything, wins)"""
+    if a is None or b is None:
+        return None
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+class DisplayWriter:
+    """Send frames to a backend from a dedicated writer thread
+
+    `submit()` drops a copy of the frame into a single-slot mailbox and
+    returns immediately, so collection and rendering never wait on the
+    bus. If the writer is still busy when a newer frame arrives, the
+    older one is replaced (latest frame wins) and counted as dropped;
+    its dirty rectangle is merged into the newer frame's. After a failed
+    transfer the panel contents are unknown, so the backend is told to
+    send the next frame in full, and the failed frame is retried after
+    RETRY_DELAY unless a newer one arrives first. Transfer
+    failures are counted by exception type in `error_counts` (a
+    profiling.ErrorCounts), if given.
+    """
+
+    RETRY_DELAY = 1.0
+
+    def __init__(self, backend, timings=None, error_counts=None):
+        self.backend = backend
+        self.timings = timings
+        self.error_counts = error_counts
+        self._cond = threading.Condition()
+        self._frame = None
+        self._dirty = None
+        self._busy = False
+        self._closing = False
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="display-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, dirty=None):
+        """Queue a copy of image for display, replacing any unsent frame
+
+        dirty is the (x0, y0, x1, y1) rectangle changed since the previous
+        submitted frame, or None if anything may have changed.
+        """
+        frame = image.copy()
+        with self._cond:
+            if self._frame is not None:
+                self.frames_dropped += 1
+                dirty = union_rect(self._dirty, dirty)
+            self._frame = frame
+            self._dirty = dirty
+            self._cond.notify()
+
+    def _run(self):
+        backend = self.backend
+        retry = None  # frame whose transfer failed
+        while True:
+            with self._cond:
+                if retry is not None:
+                    self._cond.wait_for(lambda: self._frame is not None or self._closing, self.RETRY_DELAY)
+                else:
+                    while self._frame is None and not self._closing:
+                        self._cond.wait()
+                if self._closing:
+                    return
+                if self._frame is not None:
+                    frame, self._frame = self._frame, None
+                    dirty, self._dirty = self._dirty, None
+                else:
+                    frame, dirty = retry, None
+                retry = None
+                self._busy = True
+            try:
+                backend.show(frame, dirty)
+                self.frames_written += 1
+                if self.timings is not None:
+                    self.timings.record("pack", backend.last_pack)
+                    self.timings.record("transfer", backend.last_transfer)
+            except Exception as e:
+                # A NACK or bus error leaves the panel partly updated: resend everything
+                self.errors += 1
+                backend.invalidate()
+                retry = frame
+                if self.error_counts is not None and self.error_counts.record("transfer", e):
+                    print(f"Display write failed ({type(e).__name__}: {e}), counting further failures")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every submitted frame has been sent, return False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._frame is None and not self._busy, timeout)
+
+    def close(self, timeout=2.0):
+        """Stop the writer after any in-flight transfer so the caller can use the backend"""
+        with self._cond:
+            self._closing = True
+            self._frame = None
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats.update(frames_written=self.frames_written,
+                     frames_dropped=self.frames_dropped,
+                     write_errors=self.errors)
+        return stats
+
+BACKENDS = {
+    SSD1306Backend.name: SSD1306Backend,
+    VirtualBackend.name: VirtualBackend,
+}
+
+def create_backend(display_config):
+    """Create the backend named by $OLED_BACKEND or display.backend in config (settings.DisplaySettings)"""
+    name = os.environ.get("OLED_BACKEND") or display_config.backend
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown display backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return backend_class(
+        display_config.width,
+        display_config.height,
+        i2c_address=int(display_config.i2c_address, 16),
+        rotation=display_config.rotation,
+        output=os.environ.get("OLED_VIRTUAL_OUTPUT") or display_config.virtual_output,
+        image_format=display_config.virtual_format,
+    )
@@ -0,0 +1,158 @@
+# Prometheus exporter for the OLED stats display
+# Serves the values the collectors already hold in memory in the text
+# exposition format, from a loopback HTTP listener and/or a node_exporter
+# textfile-collector file. Nothing here ever triggers a collection
+
+import asyncio
+import math
+import os
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Slow or idle clients are dropped after this many seconds
+REQUEST_TIMEOUT = 5.0
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+def render(families, prefix):
+    """Format metric families as Prometheus text
+
+    Each family is (name, type, help, samples) with samples as
+    (labels, value) pairs and labels a tuple of (name, value) pairs; a
+    sample may also be (suffix, labels, value) for the _bucket, _sum and
+    _count series of a histogram. Families without samples are left out.
+    """
+    lines = []
+    for name, kind, help_text, samples in families:
+        samples = list(samples)
+        if not samples:
+            continue
+        name = prefix + name
+        lines.append(f"# HELP {name} {_escape(help_text)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name}{suffix} {_format_value(value)}")
+    lines.append("")
+    return "\n".join(lines)
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics on the event loop
+
+    `render_text()` is called once per scrape and must only read values that
+    are already in memory.
+    """
+
+    def __init__(self, render_text, host, port):
+        self.render_text = render_text
+        self.host = host
+        self.port = port
+        self.server = None
+        self.scrapes = 0
+        self.errors = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+            method, _, rest = request.partition(b" ")
+            path = rest.split(b" ", 1)[0].split(b"?", 1)[0]
+            if method not in (b"GET", b"HEAD"):
+                status, body = "405 Method Not Allowed", b"Method not allowed\n"
+            elif path not in (b"/metrics", b"/"):
+                status, body = "404 Not Found", b"Try /metrics\n"
+            else:
+                status, body = "200 OK", self.render_text().encode()
+                self.scrapes += 1
+            header = (f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+            writer.write(header.encode() if method == b"HEAD" else header.encode() + body)
+            await asyncio.wait_for(writer.drain(), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            self.errors += 1
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+def write_textfile(path, text):
+    """Replace path with text atomically, so node_exporter never reads a partial file
+
+    The text goes to a temporary file in the same directory (node_exporter
+    only reads *.prom), is fsynced, and is renamed over path.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        raise
+
+class TextfileWriter:
+    """Rewrite a file (the node_exporter textfile or the status file) every interval seconds
+
+    The text is rendered on the event loop (a consistent snapshot of the
+    values) and written on the executor, so a slow disk never holds up
+    the display. Failures are reported once until a write succeeds again.
+    """
+
+    def __init__(self, render_text, path, interval):
+        self.render_text = render_text
+        self.path = path
+        self.interval = interval
+        self.writes = 0
+        self.errors = 0
+        self.pending = None  # executor future of the write in progress
+
+    async def run(self, executor):
+        loop = asyncio.get_running_loop()
+        failing = False
+        while True:
+            text = self.render_text()
+            try:
+                self.pending = loop.run_in_executor(executor, write_textfile, self.path, text)
+                # shield() lets a write in progress finish when the task is cancelled
+                await asyncio.shield(self.pending)
+                self.writes += 1
+                if failing:
+                    print(f"{self.path} written again")
+                failing = False
+            except OSError as e:
+                self.errors += 1
+                if not failing:
+                    print(f"Cannot write {self.path}: {e}")
+                failing = True
+            await asyncio.sleep(self.interval)
+
+    async def remove(self, timeout=1.0):
+        """Delete the file (after any write in progress) so nobody reads stale values"""
+        if self.pending is not None:
+            await asyncio.wait([self.pending], timeout=timeout)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
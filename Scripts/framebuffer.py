@@ -0,0 +1,226 @@
+# Fast framebuffer packing for the SSD1306
+# Converts a PIL "1" image to the panel's page layout with numpy instead
+# of the driver's per-pixel Python loop in oled.image()
+
+import importlib.util
+import threading
+
+# numpy is optional, and slow to import on small Pis, so it is only
+# imported when a packer is first needed (or preloaded in the background)
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+np = None
+
+def load_numpy():
+    """Import numpy on first use, return True if it is available"""
+    global np
+    if np is None and NUMPY_AVAILABLE:
+        import numpy
+        np = numpy
+    return np is not None
+
+def preload_numpy():
+    """Import numpy on a background thread so startup does not wait for it"""
+    if not NUMPY_AVAILABLE or np is not None:
+        return None
+    thread = threading.Thread(target=load_numpy, name="numpy-import", daemon=True)
+    thread.start()
+    return thread
+
+class PagePacker:
+    """Pack PIL "1" images into SSD1306 page format (8 vertical pixels per byte)
+
+    Byte `page * width + x` holds pixels (x, page*8) .. (x, page*8 + 7) with
+    the top pixel in bit 0, exactly what adafruit_framebuf's MVLSB format
+    produces. Rotation 2 is handled by flipping the array once per frame.
+    """
+
+    def __init__(self, width, height, rotation=0):
+        if height % 8:
+            raise ValueError("height must be a multiple of 8")
+        if rotation not in (0, 2):
+            raise ValueError("only rotation 0 and 2 are supported")
+        if not load_numpy():
+            raise ValueError("numpy is not installed")
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.flip = rotation == 2
+        self._dest = None
+        self._dest_buf = None
+
+    def pack(self, img):
+        """Return the page-packed frame as a (pages, width) uint8 array"""
+        # "1" images are stored MSB-first, one bit per pixel, rows padded to bytes
+        raw = np.frombuffer(img.tobytes(), dtype=np.uint8)
+        bits = np.unpackbits(raw).reshape(self.height, -1)[:, :self.width]
+        if self.flip:
+            bits = bits[::-1, ::-1]
+        # (pages, 8 rows, width) -> (pages, width, 8 rows), then 8 rows -> 1 byte
+        columns = bits.reshape(self.pages, 8, self.width).transpose(0, 2, 1)
+        return np.packbits(columns, axis=-1, bitorder="little").reshape(self.pages, self.width)
+
+    def pack_into(self, img, buf):
+        """Pack img straight into a driver buffer (e.g. oled.buf)"""
+        if self._dest_buf is not buf:
+            self._dest = np.frombuffer(buf, dtype=np.uint8)
+            self._dest_buf = buf
+        self._dest[:] = self.pack(img).ravel()
+
+def make_packer(oled):
+    """Return a PagePacker for the display, or None to use oled.image()"""
+    if np is None or not hasattr(oled, "buf"):
+        return None
+    # Match the software rotation oled.image() would apply
+    rotation = getattr(oled, "rotation", 0)
+    try:
+        return PagePacker(oled.width, oled.height, rotation)
+    except ValueError:
+        return None
+
+# SSD1306 addressing commands (horizontal addressing mode)
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+# Bytes of command overhead for one address window (2 commands + 4 args)
+WINDOW_OVERHEAD = 6
+
+class PartialUpdater:
+    """Send only the changed parts of the framebuffer to the panel
+
+    Keeps a copy of the last transmitted buffer, finds the changed column
+    span of every page and sends each run of dirty pages as one column/page
+    address window (split again when merging would send more bytes than it
+    saves). Unchanged frames are skipped entirely.
+    """
+
+    def __init__(self, width, height, write_cmd, write_data, col_offset=0):
+        self.width = width
+        self.pages = height // 8
+        self.write_cmd = write_cmd
+        self.write_data = write_data
+        self.col_offset = col_offset
+        self.last = bytearray(width * self.pages)
+        self.valid = False
+        # Counters for measuring the bus savings
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.partial_frames = 0
+        self.bytes_sent = 0
+
+    def invalidate(self):
+        """Force the next frame to be sent in full (e.g. after oled.show())"""
+        self.valid = False
+
+    def dirty_spans(self, buf, window=None):
+        """Return [(page, first_col, last_col)] for every page that changed
+
+        With window=(page0, page1, col0, col1) only that part of the
+        buffer is compared; the caller guarantees nothing changed outside.
+        """
+        width = self.width
+        if not self.valid:
+            return [(page, 0, width - 1) for page in range(self.pages)]
+        page0, page1, col0, col1 = window or (0, self.pages - 1, 0, width - 1)
+        spans = []
+        last = self.last
+        for page in range(page0, page1 + 1):
+            start = page * width
+            end = start + col1 + 1
+            start += col0
+            if buf[start:end] == last[start:end]:
+                continue
+            first = start
+            while buf[first] == last[first]:
+                first += 1
+            final = end - 1
+            while buf[final] == last[final]:
+                final -= 1
+            spans.append((page, first - page * width, final - page * width))
+        return spans
+
+    def windows(self, spans):
+        """Group page spans into (page0, page1, col0, col1) address windows"""
+        windows = []
+        for page, col0, col1 in spans:
+            if windows:
+                p0, p1, c0, c1 = windows[-1]
+                if p1 == page - 1:
+                    m0, m1 = min(c0, col0), max(c1, col1)
+                    merged = (page - p0 + 1) * (m1 - m0 + 1)
+                    separate = (p1 - p0 + 1) * (c1 - c0 + 1) + (col1 - col0 + 1) + WINDOW_OVERHEAD
+                    if merged <= separate:
+                        windows[-1] = (p0, page, m0, m1)
+                        continue
+            windows.append((page, page, col0, col1))
+        return windows
+
+    def show(self, buf, window=None):
+        """Send the changed regions of buf, return the number of bytes sent"""
+        spans = self.dirty_spans(buf, window)
+        if not spans:
+            self.frames_skipped += 1
+            return 0
+        sent = 0
+        width = self.width
+        for p0, p1, c0, c1 in self.windows(spans):
+            self.write_cmd(SET_COL_ADDR)
+            self.write_cmd(c0 + self.col_offset)
+            self.write_cmd(c1 + self.col_offset)
+            self.write_cmd(SET_PAGE_ADDR)
+            self.write_cmd(p0)
+            self.write_cmd(p1)
+            if c0 == 0 and c1 == width - 1:
+                data = bytes(buf[p0 * width:(p1 + 1) * width])
+            else:
+                data = b"".join(bytes(buf[p * width + c0:p * width + c1 + 1])
+                                for p in range(p0, p1 + 1))
+            self.write_data(data)
+            sent += WINDOW_OVERHEAD + len(data)
+        self.last[:] = buf
+        if self.valid and sent < WINDOW_OVERHEAD + len(self.last):
+            self.partial_frames += 1
+        self.valid = True
+        self.frames_sent += 1
+        self.bytes_sent += sent
+        return sent
+
+    def stats(self):
+        """Return the transfer counters and the saving against full frames"""
+        frames = self.frames_sent + self.frames_skipped
+        full = frames * (WINDOW_OVERHEAD + len(self.last))
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_partial": self.partial_frames,
+            "frames_skipped": self.frames_skipped,
+            "bytes_sent": self.bytes_sent,
+            "bytes_full_frames": full,
+            "saved_percent": 100 * (1 - self.bytes_sent / full) if full else 0.0,
+        }
+
+def dirty_window(rect, width, height, rotation=0):
+    """Return the (page0, page1, col0, col1) panel window covering an image rectangle
+
+    rect is (x0, y0, x1, y1) with inclusive corners in image coordinates;
+    with rotation 2 the image is flipped on its way into the buffer.
+    """
+    x0, y0, x1, y1 = rect
+    x0, y0 = max(0, x0), max(0, y0)
+    x1, y1 = min(width - 1, x1), min(height - 1, y1)
+    if rotation == 2:
+        x0, x1 = width - 1 - x1, width - 1 - x0
+        y0, y1 = height - 1 - y1, height - 1 - y0
+    return y0 // 8, y1 // 8, x0, x1
+
+def make_partial_updater(oled):
+    """Return a PartialUpdater for an SSD1306_I2C display, or None to use oled.show()"""
+    if getattr(oled, "page_addressing", False) or not hasattr(oled, "i2c_device"):
+        return None
+    i2c_device = oled.i2c_device
+
+    def write_data(data):
+        # 0x40 control byte: the rest of the transfer is display RAM data
+        with i2c_device:
+            i2c_device.write(b"\x40" + data)
+
+    # Narrow panels are centred in the controller's 128 columns
+    col_offset = (128 - oled.width) // 2 if oled.width != 128 else 0
+    return PartialUpdater(oled.width, oled.height, oled.write_cmd, write_data, col_offset)
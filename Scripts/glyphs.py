@@ -0,0 +1,90 @@
+# Glyph bitmap cache for the OLED stats display
+# Rasterizes each character once through FreeType and composites text by
+# pasting the cached 1-bit bitmaps, instead of calling draw.text() per frame
+
+from PIL import Image, ImageDraw
+
+# Characters checked against draw.text() before a font is trusted
+SELF_CHECK_TEXT = "0123456789./%GBC"
+
+class GlyphCache:
+    """Cache of pre-rasterized 1-bit glyphs keyed by (font, size, codepoint)
+
+    Each entry is (mask, x_offset, y_offset, advance). Text is drawn by
+    pasting masks left to right, which matches draw.text() for fonts whose
+    glyphs sit on whole-pixel advances without kerning. Every font is
+    checked once against draw.text(); fonts that fail fall back to it.
+    """
+
+    def __init__(self):
+        self.glyphs = {}
+        self.exact = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _font_key(self, font):
+        return (font.path, font.size)
+
+    def glyph(self, font, char):
+        """Return the cached (mask, x_offset, y_offset, advance) for a character"""
+        key = (font.path, font.size, ord(char))
+        entry = self.glyphs.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        left, top, right, bottom = font.getbbox(char)
+        mask = None
+        if right > left and bottom > top:
+            mask = Image.new("1", (right - left, bottom - top))
+            ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+        entry = (mask, left, top, font.getlength(char))
+        self.glyphs[key] = entry
+        return entry
+
+    def _render(self, image, xy, text, font):
+        x, y = xy
+        for char in text:
+            mask, dx, dy, advance = self.glyph(font, char)
+            if mask is not None:
+                image.paste(255, (int(x + dx), int(y + dy)), mask)
+            x += advance
+        return x - xy[0]
+
+    def is_exact(self, font):
+        """Check once per font that pasted glyphs match draw.text()"""
+        key = self._font_key(font)
+        exact = self.exact.get(key)
+        if exact is None:
+            left, top, right, bottom = font.getbbox(SELF_CHECK_TEXT)
+            size = (max(right, 1) + 2, max(bottom, 1) + 2)
+            expected = Image.new("1", size)
+            ImageDraw.Draw(expected).text((1, 1), SELF_CHECK_TEXT, font=font, fill=255)
+            actual = Image.new("1", size)
+            self._render(actual, (1, 1), SELF_CHECK_TEXT, font)
+            # Kerning pairs or fractional advances would shift glyphs
+            exact = (expected.tobytes() == actual.tobytes()
+                     and font.getlength(SELF_CHECK_TEXT) ==
+                     sum(font.getlength(c) for c in SELF_CHECK_TEXT))
+            self.exact[key] = exact
+        return exact
+
+    def draw_text(self, image, draw, xy, text, font):
+        """Draw text in white at xy, return the advance width"""
+        if not self.is_exact(font):
+            draw.text(xy, text, font=font, fill=255)
+            return font.getlength(text)
+        return self._render(image, xy, text, font)
+
+    def text_width(self, text, font):
+        """Return the advance width of text, from cached glyphs when the font allows"""
+        if not self.is_exact(font):
+            return font.getlength(text)
+        width = 0
+        for char in text:
+            width += self.glyph(font, char)[3]
+        return width
+
+    def stats(self):
+        """Return the cache hit/miss counters"""
+        return {"glyphs": len(self.glyphs), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,259 @@
+# Metric history for the OLED stats display
+# Fixed-size ring buffers of recent samples, a memory-mapped history file
+# that survives restarts, and sparkline drawing for the graph screen
+# (numpy column masks when numpy is loaded, PIL lines otherwise)
+
+import csv
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+from PIL import Image
+
+import framebuffer
+
+# One sample per column of a 128 pixel wide panel
+HISTORY_SIZE = 128
+
+class RingBuffer:
+    """Fixed-size float ring buffer with O(1), allocation-free append
+
+    Storage is one preallocated array('f') of `size` samples, so memory
+    use is `nbytes` for the life of the process.
+    """
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.size = size
+        self.data = array("f", bytes(4 * size))
+        self.index = 0  # next slot to write
+        self.count = 0
+
+    def append(self, value):
+        """Store a sample, overwriting the oldest once full"""
+        self.data[self.index] = value
+        self.index += 1
+        if self.index == self.size:
+            self.index = 0
+        if self.count < self.size:
+            self.count += 1
+
+    def latest(self):
+        """Return the newest sample (0.0 when empty)"""
+        return self.data[self.index - 1] if self.count else 0.0
+
+    def values(self):
+        """Return the samples oldest first as a new array"""
+        if self.count < self.size:
+            return self.data[:self.count]
+        return self.data[self.index:] + self.data[:self.index]
+
+    @property
+    def nbytes(self):
+        return self.data.itemsize * self.size
+
+# History file layout: a fixed 256 byte header, then `capacity` records
+#   header: magic, version, metric count, record size, capacity, then
+#           one 16 byte NUL-padded name per metric
+#   record: sequence (u64, 0 = empty), unix time (f64), one f32 per
+#           metric, CRC32 of everything before it, padded to a power of two
+# Record sizes are powers of two no larger than the header, so a record never
+# straddles a page; a torn write fails its CRC and is skipped on load
+HISTORY_MAGIC = b"OLEDHIST"
+HISTORY_VERSION = 1
+HEADER = struct.Struct("=8sHHII")
+HEADER_SIZE = 256
+NAME_SIZE = 16
+MAX_METRICS = (HEADER_SIZE - HEADER.size) // NAME_SIZE
+
+def _record_struct(count):
+    """Return (struct without padding, padded record size) for count metrics"""
+    record = struct.Struct(f"=Qd{count}f")
+    size = 1
+    while size < record.size + 4:
+        size *= 2
+    return record, size
+
+def _unpack_header(data):
+    """Return (names, record_size, capacity) from a history file header, or None"""
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, count, record_size, capacity = HEADER.unpack_from(data, 0)
+    if magic != HISTORY_MAGIC or version != HISTORY_VERSION or not 0 < count <= MAX_METRICS:
+        return None
+    names = tuple(
+        data[HEADER.size + i * NAME_SIZE:HEADER.size + (i + 1) * NAME_SIZE].rstrip(b"\0").decode()
+        for i in range(count)
+    )
+    return names, record_size, capacity
+
+def _read_records(data, count, record_size, capacity):
+    """Return the valid (sequence, time, values) records oldest first"""
+    record, _ = _record_struct(count)
+    crc_offset = record.size
+    rows = []
+    for slot in range(capacity):
+        offset = HEADER_SIZE + slot * record_size
+        if offset + record_size > len(data):
+            break
+        fields = record.unpack_from(data, offset)
+        sequence = fields[0]
+        if not sequence or (sequence - 1) % capacity != slot:
+            continue
+        (crc,) = struct.unpack_from("=I", data, offset + crc_offset)
+        if zlib.crc32(data[offset:offset + crc_offset]) != crc:
+            continue  # torn or corrupt record
+        rows.append((sequence, fields[1], fields[2:]))
+    rows.sort()
+    return rows
+
+class HistoryFile:
+    """Fixed-size ring of metric samples in a memory-mapped file
+
+    Appends are plain stores into the mapping (no syscalls); the kernel
+    writes the pages back, so samples survive a crash or restart of this
+    process. A file with a different layout (other metrics or capacity)
+    is reinitialized.
+    """
+
+    def __init__(self, path, names, capacity):
+        if len(names) > MAX_METRICS:
+            raise ValueError(f"at most {MAX_METRICS} metrics fit in a history file")
+        self.path = path
+        self.names = tuple(names)
+        self.capacity = capacity
+        self.record, self.record_size = _record_struct(len(names))
+        self.crc = struct.Struct("=I")
+        size = HEADER_SIZE + capacity * self.record_size
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        if _unpack_header(self.map) != (self.names, self.record_size, capacity):
+            self._initialize()
+        self.rows = _read_records(self.map, len(self.names), self.record_size, capacity)
+        self.sequence = self.rows[-1][0] if self.rows else 0
+
+    def _initialize(self):
+        self.map[:] = bytes(len(self.map))
+        HEADER.pack_into(self.map, 0, HISTORY_MAGIC, HISTORY_VERSION, len(self.names),
+                         self.record_size, self.capacity)
+        for i, name in enumerate(self.names):
+            encoded = name.encode()[:NAME_SIZE]
+            offset = HEADER.size + i * NAME_SIZE
+            self.map[offset:offset + len(encoded)] = encoded
+
+    def append(self, timestamp, values):
+        """Write one row of samples into the next slot"""
+        self.sequence += 1
+        offset = HEADER_SIZE + (self.sequence - 1) % self.capacity * self.record_size
+        self.record.pack_into(self.map, offset, self.sequence, timestamp, *values)
+        end = offset + self.record.size
+        self.crc.pack_into(self.map, end, zlib.crc32(self.map[offset:end]))
+
+    def close(self):
+        """Flush the mapping to disk and unmap it"""
+        self.map.flush()
+        self.map.close()
+
+def read_history(path):
+    """Return (names, [(time, values)]) from a history file, oldest first"""
+    with open(path, "rb") as f:
+        data = f.read()
+    header = _unpack_header(data)
+    if header is None:
+        raise ValueError(f"{path} is not a history file")
+    names, record_size, capacity = header
+    rows = _read_records(data, len(names), record_size, capacity)
+    return names, [(timestamp, values) for _, timestamp, values in rows]
+
+def dump_history(path, output_format, out):
+    """Write a history file to out as CSV or JSON"""
+    names, rows = read_history(path)
+    if output_format == "json":
+        json.dump([{"time": timestamp, **dict(zip(names, values))} for timestamp, values in rows],
+                  out, indent=2)
+        out.write("\n")
+    else:
+        writer = csv.writer(out)
+        writer.writerow(("time",) + names)
+        for timestamp, values in rows:
+            writer.writerow((f"{timestamp:.3f}",) + tuple(round(value, 3) for value in values))
+
+class MetricHistory:
+    """One RingBuffer per metric name, all the same size
+
+    With a HistoryFile attached, rows recorded through `record_row()` are
+    also persisted, and the buffers start out filled from the file.
+    """
+
+    def __init__(self, names, size=HISTORY_SIZE, store=None):
+        self.size = size
+        self.names = tuple(names)
+        self.buffers = {name: RingBuffer(size) for name in names}
+        self.store = store
+        if store is not None:
+            for _, _, values in store.rows[-size:]:
+                for name, value in zip(self.names, values):
+                    self.buffers[name].append(value)
+
+    def record(self, name, value):
+        """Append a sample to a metric's history"""
+        self.buffers[name].append(value)
+
+    def record_row(self, timestamp, values):
+        """Append one sample per metric (in `names` order) and persist the row"""
+        for name, value in zip(self.names, values):
+            self.buffers[name].append(value)
+        if self.store is not None:
+            self.store.append(timestamp, values)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def __getitem__(self, name):
+        return self.buffers[name]
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+def draw_sparkline(image, draw, box, samples, low, high):
+    """Draw samples as filled columns inside box=(x, y, width, height)
+
+    The newest sample is at the right edge; older ones that do not fit
+    are cut off on the left. Values are clamped to [low, high].
+    """
+    x, y, width, height = box
+    samples = samples[-width:]
+    count = len(samples)
+    if not count or height <= 0:
+        return
+    span = (high - low) or 1.0
+    left = x + width - count
+    np = framebuffer.np
+    if np is not None:
+        # Column heights -> (height, count) mask in one broadcast, pasted as 1-bit
+        values = np.frombuffer(samples, dtype=np.float32)
+        filled = np.rint(np.clip((values - low) / span, 0.0, 1.0) * height)
+        rows = np.arange(height, 0, -1).reshape(-1, 1)
+        mask = rows <= filled
+        packed = np.packbits(mask, axis=1)
+        column = Image.frombytes("1", (count, height), packed.tobytes())
+        image.paste(column, (left, y))
+        return
+    bottom = y + height - 1
+    for i, value in enumerate(samples):
+        filled = round(min(max((value - low) / span, 0.0), 1.0) * height)
+        if filled:
+            draw.line((left + i, bottom - filled + 1, left + i, bottom), fill=255)
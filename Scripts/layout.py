@@ -0,0 +1,111 @@
+# Declarative screen layouts for the OLED stats display
+# The "layout" config (rows of widget cells) is compiled once at startup into
+# a flat list of draw operations with precomputed positions and text budgets
+
+from collections.abc import Mapping
+
+# Built-in layouts by panel height; "load" becomes "cpu" with display.line2 = "cpu"
+DEFAULT_LAYOUTS = {
+    64: {
+        "rows": [
+            ["network"],
+            [{"widget": "load", "width": 75}, "temp"],
+            ["memory"],
+            ["disk"],
+        ]
+    },
+    32: {
+        "rows": [
+            ["network"],
+            [{"widget": "load", "width": 44}, {"widget": "temp", "width": 40}, "memory_percent"],
+        ]
+    },
+}
+
+ALIGNMENTS = ("left", "right", "center")
+
+class LayoutError(ValueError):
+    """The layout config cannot be compiled for this panel"""
+
+def default_layout(height, line2="load"):
+    """Return the built-in layout for a panel height"""
+    layout = DEFAULT_LAYOUTS[64 if height >= 64 else 32]
+    if line2 == "load":
+        return layout
+    return {"rows": [
+        [dict(cell, widget=line2) if isinstance(cell, Mapping) and cell["widget"] == "load" else
+         (line2 if cell == "load" else cell) for cell in row]
+        for row in layout["rows"]
+    ]}
+
+class DrawOp:
+    """One compiled cell: where its icon and text go and how wide the text may be
+
+    `box` is the cell's (x0, y0, x1, y1) rectangle and `last` the
+    (icon, text) it last drew, so unchanged cells can be skipped.
+    """
+
+    __slots__ = ("widget", "value", "painter", "icon_x", "text_x", "y", "right", "height", "align",
+                 "budget", "box", "last")
+
+    def __init__(self, widget, value, icon_x, text_x, y, right, height, align):
+        self.widget = widget
+        self.value = value
+        self.painter = None
+        self.icon_x = icon_x
+        self.text_x = text_x
+        self.y = y
+        self.right = right
+        self.height = height
+        self.align = align
+        self.budget = right - text_x
+        self.box = (text_x if icon_x is None else icon_x, y, right - 1, y + height - 1)
+        self.last = None
+
+def invalidate(plan):
+    """Make every cell of a plan redraw on its next frame"""
+    for op in plan:
+        op.last = None
+
+def compile_layout(layout, width, height, line_height, icon_width, widgets):
+    """Compile a layout config into a list of DrawOp
+
+    `widgets` maps a widget name to (value, make_painter): value(step)
+    returns (icon, text) each frame; make_painter(op), if given, is
+    called once here and returns a function that draws a graphic (the
+    "text" is then whatever tells its frames apart). Rows are
+    line_height tall; cells without a width share what is left of their
+    row. icon_width is 0 without icons.
+    """
+    rows = layout.get("rows")
+    if not rows:
+        raise LayoutError("layout has no rows")
+    if len(rows) * line_height > height:
+        raise LayoutError(f"{len(rows)} rows of {line_height}px do not fit a {height}px tall panel")
+    plan = []
+    for row_index, row in enumerate(rows):
+        y = row_index * line_height
+        cells = [cell if isinstance(cell, Mapping) else {"widget": cell} for cell in row]
+        fixed = sum(cell.get("width", 0) for cell in cells)
+        flexible = sum(1 for cell in cells if "width" not in cell)
+        if fixed > width or (flexible and fixed >= width):
+            raise LayoutError(f"row {row_index + 1} is wider than the {width}px panel")
+        share = (width - fixed) // flexible if flexible else 0
+        x = 0
+        for cell in cells:
+            name = cell.get("widget")
+            if name not in widgets:
+                raise LayoutError(f"unknown widget {name!r} in row {row_index + 1}, "
+                                  f"expected one of {', '.join(widgets)}")
+            align = cell.get("align", "left")
+            if align not in ALIGNMENTS:
+                raise LayoutError(f"unknown align {align!r} for {name}, expected one of {', '.join(ALIGNMENTS)}")
+            cell_width = cell.get("width", share)
+            icon = icon_width if cell.get("icon", True) else 0
+            value, make_painter = widgets[name]
+            op = DrawOp(name, value, x if icon else None, x + icon, y, x + cell_width, line_height, align)
+            if make_painter is not None:
+                op.painter = make_painter(op)
+            plan.append(op)
+            x += cell_width
+    return plan
@@ -0,0 +1,208 @@
+# Event-driven interface/IPv4 tracking over rtnetlink
+# Keeps an in-memory interface table that only changes when the kernel
+# reports a link or address change, instead of polling `ip addr` every tick
+
+import errno
+import socket
+import struct
+import threading
+
+# Netlink constants (linux/netlink.h, linux/rtnetlink.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLMSG_OVERRUN = 4
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+IFLA_IFNAME = 3
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+
+NLMSGHDR = struct.Struct("=IHHII")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBi")
+RTATTR = struct.Struct("=HH")
+RTGENMSG = struct.Struct("=Bxxx")
+
+# Only include physical interfaces (skip docker, veth, br, tailscale, etc.)
+SKIP_PREFIXES = ('docker', 'br-', 'veth', 'tailscale', 'tun', 'tap')
+
+def classify_interface(name):
+    """Return "lan", "wifi" or None for an interface name"""
+    if name == "lo" or name.startswith(SKIP_PREFIXES):
+        return None
+    if name.startswith('eth') or name.startswith('en'):
+        return "lan"
+    if name.startswith('wlan') or name.startswith('wl'):
+        return "wifi"
+    return None
+
+def _align(n):
+    return (n + 3) & ~3
+
+def parse_attrs(data, offset, end):
+    """Parse rtattr TLVs from data[offset:end] into a {type: bytes} dict"""
+    attrs = {}
+    while offset + RTATTR.size <= end:
+        rta_len, rta_type = RTATTR.unpack_from(data, offset)
+        if rta_len < RTATTR.size:
+            break
+        attrs[rta_type] = data[offset + RTATTR.size:offset + rta_len]
+        offset += _align(rta_len)
+    return attrs
+
+class InterfaceTable:
+    """In-memory interface/IPv4 table fed by rtnetlink multicast events
+
+    `snapshot()` returns an immutable tuple of ("lan"|"wifi", ip) pairs
+    that is only rebuilt when the kernel reports a change, so the render
+    loop never touches the socket. Pass `sock` to feed recorded messages
+    through any object with recv/send (e.g. one end of a socketpair).
+    """
+
+    RECV_SIZE = 65536
+
+    def __init__(self, sock=None):
+        if sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        self.sock = sock
+        self.links = {}   # ifindex -> name
+        self.addrs = {}   # ifindex -> [ip, ...] in kernel order
+        self._snapshot = ()
+        self._seq = 0
+        self._thread = None
+        self.events = 0
+        self.resyncs = 0
+
+    def snapshot(self):
+        """Return the current ("lan"|"wifi", ip) entries"""
+        return self._snapshot
+
+    def _rebuild(self):
+        entries = []
+        for index in sorted(self.addrs):
+            name = self.links.get(index)
+            if name is None:
+                continue
+            kind = classify_interface(name)
+            if kind is None:
+                continue
+            for ip in self.addrs[index]:
+                entries.append((kind, ip))
+        # Single reference swap - readers see either the old or new tuple
+        self._snapshot = tuple(entries)
+
+    def _request(self, msg_type, family):
+        self._seq += 1
+        body = RTGENMSG.pack(family)
+        header = NLMSGHDR.pack(NLMSGHDR.size + len(body), msg_type,
+                               NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0)
+        self.sock.send(header + body)
+
+    def _drain_dump(self):
+        """Handle messages until the current dump finishes"""
+        while True:
+            if self.handle(self.sock.recv(self.RECV_SIZE)):
+                return
+
+    def resync(self):
+        """Re-read the full link and address tables from the kernel"""
+        self.links.clear()
+        self.addrs.clear()
+        self._request(RTM_GETLINK, socket.AF_UNSPEC)
+        self._drain_dump()
+        self._request(RTM_GETADDR, socket.AF_INET)
+        self._drain_dump()
+        self.resyncs += 1
+        self._rebuild()
+
+    def handle(self, data):
+        """Apply a buffer of netlink messages, return True if it ended a dump"""
+        offset = 0
+        done = False
+        changed = False
+        while offset + NLMSGHDR.size <= len(data):
+            msg_len, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+            if msg_len < NLMSGHDR.size:
+                break
+            body = offset + NLMSGHDR.size
+            end = offset + msg_len
+            if msg_type in (NLMSG_DONE, NLMSG_ERROR):
+                done = True
+            elif msg_type in (RTM_NEWLINK, RTM_DELLINK):
+                changed |= self._handle_link(msg_type, data, body, end)
+            elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+                changed |= self._handle_addr(msg_type, data, body, end)
+            offset += _align(msg_len)
+        if changed:
+            self.events += 1
+            self._rebuild()
+        return done
+
+    def _handle_link(self, msg_type, data, body, end):
+        _, _, index, _, _ = IFINFOMSG.unpack_from(data, body)
+        if msg_type == RTM_DELLINK:
+            self.addrs.pop(index, None)
+            return self.links.pop(index, None) is not None
+        name = parse_attrs(data, body + IFINFOMSG.size, end).get(IFLA_IFNAME)
+        if name is None:
+            return False
+        name = bytes(name).rstrip(b"\0").decode("utf-8", "replace")
+        if self.links.get(index) == name:
+            return False
+        self.links[index] = name
+        return True
+
+    def _handle_addr(self, msg_type, data, body, end):
+        family, _, _, _, index = IFADDRMSG.unpack_from(data, body)
+        if family != socket.AF_INET:
+            return False
+        attrs = parse_attrs(data, body + IFADDRMSG.size, end)
+        # Like `ip`, prefer the local address (IFA_ADDRESS is the peer on p2p links)
+        raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+        if raw is None or len(raw) != 4:
+            return False
+        ip = socket.inet_ntoa(bytes(raw))
+        if msg_type == RTM_DELADDR:
+            ips = self.addrs.get(index)
+            if not ips or ip not in ips:
+                return False
+            ips.remove(ip)
+            if not ips:
+                del self.addrs[index]
+            return True
+        ips = self.addrs.setdefault(index, [])
+        if ip in ips:
+            return False
+        ips.append(ip)
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                self.handle(self.sock.recv(self.RECV_SIZE))
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Socket buffer overran and events were dropped - reload everything
+                    try:
+                        self.resync()
+                    except OSError:
+                        pass
+                    continue
+                return
+
+    def start(self):
+        """Load the initial table and start listening for changes"""
+        self.resync()
+        self._thread = threading.Thread(target=self._run, name="netlink", daemon=True)
+        self._thread.start()
+        return self
@@ -0,0 +1,74 @@
+# Page rotation for the OLED stats display
+# Cycles through full-screen pages, each with its own dwell time, and tells
+# the collector scheduler which collectors the visible page needs
+
+import time
+
+class Page:
+    """One full screen: its draw function, the collectors it reads, and its dwell time
+
+    Pages with an `invalidate` hook redraw incrementally: `draw()` only
+    touches what changed and returns the dirty rectangle (None if
+    nothing did), and `invalidate()` forces a full redraw. Pages without
+    one are drawn from scratch on a cleared image every frame.
+    """
+
+    __slots__ = ("name", "draw", "collectors", "dwell", "invalidate")
+
+    def __init__(self, name, draw, collectors, dwell, invalidate=None):
+        self.name = name
+        self.draw = draw
+        self.collectors = frozenset(collectors)
+        self.dwell = dwell
+        self.invalidate = invalidate
+
+class PageRotation:
+    """Show each page for its dwell time, then move on to the next
+
+    Pages are built once at startup, so a switch is an index change plus
+    one `activate(collectors)` call that resumes the collectors the new
+    page reads and pauses the rest (`always` are never paused).
+    """
+
+    def __init__(self, pages, activate, always=(), min_dwell=0.0, clock=time.monotonic):
+        if not pages:
+            raise ValueError("at least one page is required")
+        self.pages = pages
+        self.activate = activate
+        self.clock = clock
+        self.min_dwell = min_dwell
+        # Collector sets per page are computed up front, not on every switch
+        self.active_sets = [page.collectors | frozenset(always) for page in pages]
+        self.index = 0
+        self.switches = 0
+        self.next_switch = None
+
+    def start(self):
+        """Activate the first page's collectors"""
+        self.index = 0
+        self.activate(self.active_sets[0])
+        self.next_switch = self.clock() + max(self.pages[0].dwell, self.min_dwell)
+
+    def take_over(self, previous):
+        """Continue from another rotation of the same pages (same page, same switch time)"""
+        if previous.next_switch is None or len(previous.pages) != len(self.pages):
+            self.start()
+            return
+        self.index = previous.index
+        self.switches = previous.switches
+        self.next_switch = previous.next_switch
+        self.activate(self.active_sets[self.index])
+
+    def current(self, now):
+        """Return the page to draw at time now, switching when its dwell is over"""
+        if self.next_switch is None:
+            self.start()
+        if len(self.pages) > 1 and now >= self.next_switch:
+            self.index = (self.index + 1) % len(self.pages)
+            self.switches += 1
+            self.activate(self.active_sets[self.index])
+            self.next_switch = now + max(self.pages[self.index].dwell, self.min_dwell)
+        return self.pages[self.index]
+
+    def stats(self):
+        return {"page": self.pages[self.index].name, "switches": self.switches}
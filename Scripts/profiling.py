@@ -0,0 +1,188 @@
+# Startup profiling and self-instrumentation for the OLED stats display
+# Records how long each import and initialization step takes, measured
+# from process exec, for `status.py --profile-startup`, and keeps latency
+# histograms, error counts and the process's own CPU time and memory use
+# for the render loop
+
+import os
+import time
+from array import array
+from bisect import bisect_left
+
+def seconds_since_exec():
+    """Return how long ago this process was exec'd, from /proc/self/stat"""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            stat = f.read()
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        # Field 22 (starttime, clock ticks after boot); skip past "(comm)" first
+        fields = stat[stat.rindex(b")") + 2:].split()
+        start_ticks = int(fields[19])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+class StartupProfiler:
+    """Collect (label, seconds) marks between startup steps"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.marks = []
+        # Anchor our perf_counter timeline to the exec time of the process
+        self.offset = seconds_since_exec() if enabled else 0.0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def mark(self, label):
+        """Record the time since the previous mark under label"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.marks.append((label, now - self.last))
+        self.last = now
+
+    def report(self):
+        """Print the startup breakdown"""
+        if not self.enabled:
+            return
+        total = self.offset + (self.last - self.start)
+        print("Startup profile (ms):")
+        print(f"  {'interpreter + exec':<28}{self.offset * 1000:>8.1f}")
+        for label, seconds in self.marks:
+            print(f"  {label:<28}{seconds * 1000:>8.1f}")
+        print(f"  {'total since exec':<28}{total * 1000:>8.1f}")
+
+# Latency histogram bucket upper bounds in seconds (1-2.5-5 steps), then +Inf
+HISTOGRAM_BOUNDS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class _Stage:
+    __slots__ = ("count", "total", "peak", "last", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.peak = 0.0
+        self.last = 0.0
+        self.buckets = array("Q", bytes(8 * (len(HISTOGRAM_BOUNDS) + 1)))
+
+def _percentile(stage, fraction):
+    """Upper bound (seconds) of the bucket holding the given fraction of samples"""
+    wanted = fraction * stage.count
+    seen = 0
+    for bound, count in zip(HISTOGRAM_BOUNDS, stage.buckets):
+        seen += count
+        if seen >= wanted:
+            return min(bound, stage.peak)
+    return stage.peak
+
+class StageTimings:
+    """Per-stage latency histograms (plus last, average and max) for the render loop
+
+    Each stage has a fixed array('Q') of bucket counts, so recording a
+    sample is a bisect and a few increments, with no allocation.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage, seconds):
+        """Add one sample for a stage"""
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = _Stage()
+        entry.count += 1
+        entry.total += seconds
+        if seconds > entry.peak:
+            entry.peak = seconds
+        entry.last = seconds
+        entry.buckets[bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+
+    def stats(self):
+        """Return {stage: {count, last_ms, avg_ms, max_ms, p50_ms, p99_ms}}
+
+        Percentiles are bucket upper bounds, so they are estimates.
+        """
+        return {
+            stage: {
+                "count": entry.count,
+                "last_ms": round(entry.last * 1000, 3),
+                "avg_ms": round(entry.total / entry.count * 1000, 3),
+                "max_ms": round(entry.peak * 1000, 3),
+                "p50_ms": round(_percentile(entry, 0.50) * 1000, 3),
+                "p99_ms": round(_percentile(entry, 0.99) * 1000, 3),
+            }
+            for stage, entry in list(self.stages.items())
+        }
+
+    def histograms(self):
+        """Return {stage: (cumulative bucket counts, sum in seconds, count)}, buckets as HISTOGRAM_BOUNDS + Inf"""
+        result = {}
+        for stage, entry in list(self.stages.items()):
+            cumulative = []
+            seen = 0
+            for count in entry.buckets:
+                seen += count
+                cumulative.append(seen)
+            result[stage] = (cumulative, entry.total, entry.count)
+        return result
+
+class ErrorCounts:
+    """Exceptions counted by stage and exception type, with the last message of each"""
+
+    def __init__(self):
+        self.counts = {}    # (stage, type name) -> count
+        self.messages = {}  # (stage, type name) -> str(last exception)
+
+    def record(self, stage, error):
+        """Count an exception, return True if it is the first of its stage and type"""
+        key = (stage, type(error).__name__)
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        self.messages[key] = str(error)
+        return count == 1
+
+    def stats(self):
+        """Return {stage: {type: count}}"""
+        result = {}
+        for (stage, kind), count in list(self.counts.items()):
+            result.setdefault(stage, {})[kind] = count
+        return result
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+class ProcessStats:
+    """This process's CPU time (all threads) and resident memory"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+
+    def cpu_seconds(self):
+        times = os.times()
+        return times.user + times.system
+
+    def rss_bytes(self):
+        """Resident set size from /proc/self/statm (0 if unavailable)"""
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def sample(self):
+        """Return CPU seconds, average CPU % since start, RSS and uptime
+
+        Nothing is kept between calls, so the log dump, the status file and
+        --debug do not skew each other; rate(process_cpu_seconds_total)
+        gives the recent CPU use.
+        """
+        uptime = self.clock() - self.started
+        cpu = self.cpu_seconds()
+        return {
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / uptime * 100, 2) if uptime > 0 else 0.0,
+            "rss_bytes": self.rss_bytes(),
+            "uptime_seconds": round(uptime, 1),
+        }
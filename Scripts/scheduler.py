@@ -0,0 +1,224 @@
+# Tick and collector scheduling for the OLED stats display
+# Keeps a stable cadence on time.monotonic() deadlines instead of
+# sleeping a fixed interval after each (variable-length) loop iteration,
+# and runs each metric collector as its own asyncio task
+
+import asyncio
+import time
+from collections import deque
+
+class TickScheduler:
+    """Fixed-rate tick scheduler built on monotonic deadlines
+
+    Deadlines are multiples of `interval` from the first tick, so time
+    spent collecting and drawing does not push the cadence back. After a
+    stall, missed ticks are skipped instead of being run back to back.
+    """
+
+    def __init__(self, interval, history=600, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.deadline = None
+        self.ticks = 0
+        self.skipped = 0
+        # Recent lateness samples (seconds) for jitter statistics
+        self.lateness = deque(maxlen=history)
+
+    def delay(self):
+        """Return the seconds until the next tick is due (0 if it already is)"""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        return max(0.0, self.deadline - now)
+
+    def wait(self):
+        """Sleep until the next tick is due, return how late it fired (seconds)"""
+        delay = self.delay()
+        if delay > 0:
+            self.sleep(delay)
+        return self.fire()
+
+    async def wait_async(self):
+        """Like wait(), but yields to the event loop while sleeping"""
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self.fire()
+
+    def fire(self):
+        """Record that the due tick has started and schedule the next one"""
+        now = self.clock()
+        late = now - self.deadline
+        self.lateness.append(late)
+        self.ticks += 1
+
+        self.deadline += self.interval
+        if now >= self.deadline:
+            # Stalled past whole ticks - skip them rather than bunching up
+            missed = int((now - self.deadline) // self.interval) + 1
+            self.skipped += missed
+            self.deadline += missed * self.interval
+        return late
+
+    def stats(self):
+        """Return tick counts and p50/p99/max lateness in milliseconds"""
+        samples = sorted(self.lateness)
+        if not samples:
+            return {"ticks": self.ticks, "skipped": self.skipped}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+        return {
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "p50_ms": round(percentile(0.50), 3),
+            "p99_ms": round(percentile(0.99), 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+
+class Collector:
+    """State of one registered collector"""
+
+    __slots__ = ("name", "stage", "fn", "interval", "timeout", "resume", "listeners")
+
+    def __init__(self, name, fn, interval, timeout):
+        self.name = name
+        # Name of its timing and error stage
+        self.stage = f"collect_{name}"
+        self.fn = fn
+        self.interval = interval
+        self.timeout = timeout
+        # Cleared while no visible page needs this collector
+        self.resume = asyncio.Event()
+        self.resume.set()
+        # Called with every new value (see CollectorScheduler.subscribe)
+        self.listeners = []
+
+class CollectorScheduler:
+    """Run each metric collector as an asyncio task with its own interval
+
+    Cheap, non-blocking collectors (pread on /proc) run inline on the
+    event loop, and coroutine collectors are awaited under their timeout
+    (None for ones that enforce their own). Anything that can block (a
+    statvfs, a D-Bus call) must be a coroutine that runs the call on an
+    executor, like collectors.DiskCollector: an inline call cannot be
+    timed out, so `add()` rejects a timeout for one. The renderer reads
+    `values`, which always holds the last good result.
+    Collectors left out of `set_active()` pause after their current run
+    and collect again as soon as they are reactivated. Failures are also
+    counted by exception type in `error_counts` (a profiling.ErrorCounts),
+    if given.
+    """
+
+    def __init__(self, min_interval=0.0, timings=None, error_counts=None, clock=time.monotonic):
+        self.min_interval = min_interval
+        self.timings = timings
+        self.error_counts = error_counts
+        self.clock = clock
+        self.collectors = []
+        self.tasks = []
+        self.values = {}
+        self.runs = {}
+        self.errors = {}
+        self.timeouts = {}
+        # clock() time of each collector's last good result (None before the first)
+        self.updated = {}
+
+    def add(self, name, fn, interval, initial=None, timeout=None):
+        """Register a collector; intervals below min_interval are raised to it
+
+        timeout (seconds, None for no limit) only applies to coroutine collectors.
+        """
+        if timeout is not None and not asyncio.iscoroutinefunction(fn):
+            raise ValueError(f"collector {name}: a timeout needs a coroutine collector, "
+                             f"run blocking calls on an executor inside one")
+        self.collectors.append(Collector(name, fn, max(interval, self.min_interval), timeout))
+        self.values[name] = initial
+        self.runs[name] = 0
+        self.errors[name] = 0
+        self.timeouts[name] = 0
+        self.updated[name] = None
+
+    async def _collect(self, collector):
+        """Run a collector once, keeping the previous value on failure"""
+        name = collector.name
+        start = self.clock()
+        try:
+            if asyncio.iscoroutinefunction(collector.fn):
+                value = await asyncio.wait_for(collector.fn(), collector.timeout)
+            else:
+                value = collector.fn()
+            self.values[name] = value
+            self.runs[name] += 1
+            self.updated[name] = self.clock()
+            for listener in collector.listeners:
+                listener(value)
+        except asyncio.TimeoutError as e:
+            self.timeouts[name] += 1
+            if self.error_counts is not None:
+                self.error_counts.record(collector.stage, e)
+        except Exception as e:
+            self.errors[name] += 1
+            if self.error_counts is not None and self.error_counts.record(collector.stage, e):
+                print(f"Collector {name} failed ({type(e).__name__}: {e}), counting further failures")
+        if self.timings is not None:
+            self.timings.record(collector.stage, self.clock() - start)
+
+    async def _run(self, collector, first_done):
+        due = self.clock()
+        while True:
+            if not collector.resume.is_set():
+                first_done.set()
+                await collector.resume.wait()
+                # Fresh data for the page that needs it, then back on cadence
+                due = self.clock()
+            await self._collect(collector)
+            first_done.set()
+            # Step from the previous deadline so the cadence does not drift
+            due += collector.interval
+            now = self.clock()
+            if due <= now:
+                due = now + collector.interval
+            await asyncio.sleep(due - now)
+
+    def subscribe(self, name, listener):
+        """Call listener(value) with each new result of a collector, right after it is stored"""
+        for collector in self.collectors:
+            if collector.name == name:
+                collector.listeners.append(listener)
+
+    def set_interval(self, name, interval):
+        """Change a collector's interval (from its next run on)"""
+        for collector in self.collectors:
+            if collector.name == name:
+                collector.interval = max(interval, self.min_interval)
+
+    def set_active(self, names):
+        """Run only the named collectors, pausing the others"""
+        for collector in self.collectors:
+            if collector.name in names:
+                collector.resume.set()
+            else:
+                collector.resume.clear()
+
+    def active(self):
+        """Return the names of the collectors that are not paused"""
+        return [c.name for c in self.collectors if c.resume.is_set()]
+
+    async def start(self, first_timeout=1.0):
+        """Start every collector, waiting up to first_timeout for their first results"""
+        events = []
+        for collector in self.collectors:
+            first_done = asyncio.Event()
+            events.append(asyncio.create_task(first_done.wait()))
+            self.tasks.append(asyncio.create_task(self._run(collector, first_done), name=collector.name))
+        await asyncio.wait(events, timeout=first_timeout)
+        for event in events:
+            event.cancel()
+
+    def stop(self):
+        """Cancel the collector tasks"""
+        for task in self.tasks:
+            task.cancel()
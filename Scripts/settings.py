@@ -0,0 +1,383 @@
+# Typed configuration for the OLED stats display
+# config.json is merged over the defaults, checked against a schema and
+# compiled once into frozen __slots__ objects, so per-frame code reads plain
+# attributes and precomputed (normal, warn, critical) icons instead of string keys
+
+import difflib
+import ipaddress
+import json
+import types
+
+# Default configuration
+DEFAULT_CONFIG = {
+    "display": {
+        "width": 128,
+        "height": 64,
+        "i2c_address": "0x3C",
+        "rotation": 0,
+        "backend": "ssd1306",
+        "virtual_output": "",
+        "virtual_format": "png",
+        "line2": "load"
+    },
+    "timing": {
+        "refresh_interval": 1.0,
+        "rotation_interval": 3,
+        "load_interval": 1.0,
+        "temp_interval": 1.0,
+        "memory_interval": 5.0,
+        "disk_interval": 60.0,
+        "network_interval": 0,
+        "cpu_interval": 1.0,
+        "throughput_interval": 1.0,
+        "throughput_smoothing": 3.0,
+        "history_interval": 5.0,
+        "collector_timeout": 2.0
+    },
+    "fonts": {
+        "text_font": "PixelOperator.ttf",
+        "text_size": 16,
+        "text_size_large": 24,
+        "icon_font": "la-solid-900.ttf",
+        "icon_size": 14
+    },
+    "disks": {
+        "mount_points": ["/"],
+        "ttl": 300
+    },
+    "history": {
+        "path": "/var/lib/pi5-oled-status/history.bin",
+        "samples": 1440
+    },
+    "exporter": {
+        "listen": "",
+        "textfile": "",
+        "textfile_interval": 15
+    },
+    "instrumentation": {
+        "status_file": "",
+        "status_interval": 10
+    },
+    "pages": [
+        {"type": "stats", "dwell": 10}
+    ],
+    "layout": {},
+    "thresholds": {
+        "load_warn": 2.0,
+        "load_critical": 4.0,
+        "load_hysteresis": 0.25,
+        "cpu_warn": 90,
+        "cpu_critical": 98,
+        "cpu_hysteresis": 5,
+        "temp_warn": 70,
+        "temp_critical": 80,
+        "temp_hysteresis": 3,
+        "mem_warn": 80,
+        "mem_critical": 95,
+        "mem_hysteresis": 2,
+        "disk_warn": 80,
+        "disk_critical": 95,
+        "disk_hysteresis": 1
+    },
+    "icons": {
+        "hostname": "\uf108",
+        "wifi": "\uf1eb",
+        "lan": "\uf6ff",
+        "offline": "\uf011",
+        "load_normal": "\uf0e7",
+        "load_warn": "\uf06d",
+        "load_critical": "\uf06a",
+        "temp_normal": "\uf2c9",
+        "temp_warn": "\uf06d",
+        "temp_critical": "\uf06a",
+        "mem_normal": "\uf0ae",
+        "mem_warn": "\uf071",
+        "mem_critical": "\uf06a",
+        "disk_normal": "\uf0a0",
+        "disk_warn": "\uf071",
+        "disk_critical": "\uf06a"
+    }
+}
+
+# Sections whose keys become attributes ("pages" and "layout" are lists/objects)
+SECTIONS = ("display", "timing", "fonts", "disks", "history", "exporter", "instrumentation", "thresholds",
+            "icons")
+
+class ConfigError(ValueError):
+    """config.json has an unknown key, a value of the wrong type or an impossible value"""
+
+# === Schema ===
+# Every key maps to (check(value) -> bool, what the value has to be)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_i2c_address(value):
+    try:
+        return 0 <= int(value, 16) < 0x80
+    except (TypeError, ValueError):
+        return False
+
+def _is_volume(entry):
+    if isinstance(entry, str):
+        return entry.startswith("/")
+    return (isinstance(entry, dict) and set(entry) <= {"path", "label"}
+            and isinstance(entry.get("path"), str) and entry["path"].startswith("/")
+            and isinstance(entry.get("label", ""), str))
+
+def split_listen(address):
+    """Split "host:port" into (host, port), raising ValueError unless host is a loopback address"""
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]")
+    if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+        raise ValueError(f"{host} is not a loopback address")
+    port = int(port)
+    if not 0 < port < 65536:
+        raise ValueError(f"port {port} out of range")
+    return host, port
+
+def _is_listen(value):
+    if value == "":
+        return True
+    try:
+        split_listen(value)
+    except (AttributeError, ValueError):
+        return False
+    return True
+
+def one_of(*choices):
+    return lambda value: value in choices, f"one of {', '.join(repr(choice) for choice in choices)}"
+
+NUMBER = (_is_number, "a number")
+NON_NEGATIVE = (lambda value: _is_number(value) and value >= 0, "a number >= 0")
+POSITIVE = (lambda value: _is_number(value) and value > 0, "a number > 0")
+POSITIVE_INT = (lambda value: _is_int(value) and value > 0, "a positive integer")
+STRING = (lambda value: isinstance(value, str), "a string")
+GLYPH = (lambda value: isinstance(value, str) and len(value) <= 2, "one icon character (or \"\" for none)")
+
+SCHEMA = {
+    "display": {
+        "width": POSITIVE_INT,
+        "height": POSITIVE_INT,
+        "i2c_address": (_is_i2c_address, 'a hex I2C address such as "0x3C"'),
+        "rotation": one_of(0, 2),
+        "backend": one_of("ssd1306", "virtual"),
+        "virtual_output": STRING,
+        "virtual_format": one_of("png", "pbm"),
+        "line2": one_of("load", "cpu"),
+    },
+    "timing": dict({key: NON_NEGATIVE for key in DEFAULT_CONFIG["timing"]}, refresh_interval=POSITIVE),
+    "fonts": {
+        "text_font": STRING,
+        "text_size": POSITIVE_INT,
+        "text_size_large": POSITIVE_INT,
+        "icon_font": STRING,
+        "icon_size": POSITIVE_INT,
+    },
+    "disks": {
+        "mount_points": (lambda value: isinstance(value, list) and all(_is_volume(entry) for entry in value),
+                         'a list of absolute paths or {"path", "label"} objects'),
+        "ttl": NON_NEGATIVE,
+    },
+    "history": {
+        "path": STRING,
+        "samples": POSITIVE_INT,
+    },
+    "exporter": {
+        "listen": (_is_listen, '"" or a loopback "host:port" such as "127.0.0.1:9101"'),
+        "textfile": STRING,
+        "textfile_interval": POSITIVE,
+    },
+    "instrumentation": {
+        "status_file": STRING,
+        "status_interval": POSITIVE,
+    },
+    "thresholds": {key: NON_NEGATIVE if key.endswith("_hysteresis") else NUMBER
+                   for key in DEFAULT_CONFIG["thresholds"]},
+    "icons": {key: GLYPH for key in DEFAULT_CONFIG["icons"]},
+}
+
+# === Compiled config ===
+
+class Frozen:
+    """Read-only attributes, set once from keyword arguments"""
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+def _section_class(name):
+    return type(f"{name.capitalize()}Settings", (Frozen,), {
+        "__slots__": tuple(DEFAULT_CONFIG[name]),
+        "__doc__": f"The {name} section of config.json, one attribute per key",
+    })
+
+SECTION_CLASSES = {name: _section_class(name) for name in SECTIONS}
+
+class PageSettings(Frozen):
+    """One entry of the pages list"""
+
+    __slots__ = ("type", "dwell")
+
+# Metric -> (threshold prefix, icon prefix); the CPU total uses the load icons
+LEVELS = {
+    "load": ("load", "load"),
+    "cpu": ("cpu", "load"),
+    "temp": ("temp", "temp"),
+    "memory": ("mem", "mem"),
+    "disk": ("disk", "disk"),
+}
+
+class Level(Frozen):
+    """A metric's warn and critical thresholds, hysteresis and icons
+
+    `icons` is the (normal, warn, critical) triple, indexed by an
+    alerts.LevelState's state without building a key.
+    """
+
+    __slots__ = ("warn", "critical", "hysteresis", "icons")
+
+    @property
+    def bands(self):
+        return self.warn, self.critical, self.hysteresis
+
+class Levels(Frozen):
+    """One Level per metric"""
+
+    __slots__ = tuple(LEVELS)
+
+class Config(Frozen):
+    """A validated config.json
+
+    One settings object per section, the pages as PageSettings, the
+    layout as a read-only mapping, and a Level per metric in `levels`
+    (derived from thresholds and icons).
+    """
+
+    __slots__ = tuple(DEFAULT_CONFIG) + ("levels",)
+
+    def changed(self, other):
+        """Return the names of the top-level sections that differ from other"""
+        return [name for name in DEFAULT_CONFIG if getattr(self, name) != getattr(other, name)]
+
+def freeze(value):
+    """Return a read-only copy of a parsed JSON value"""
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def _check_keys(given, known, prefix):
+    """Raise ConfigError for the first key of given that is not in known"""
+    for key in given:
+        if key not in known:
+            close = difflib.get_close_matches(key, known, n=1)
+            hint = f", did you mean {prefix}{close[0]}?" if close else ""
+            raise ConfigError(f"unknown setting {prefix}{key}{hint}")
+
+def _parse_page(entry, index):
+    if isinstance(entry, str):
+        entry = {"type": entry}
+    if not isinstance(entry, dict):
+        raise ConfigError(f"pages[{index}] must be a page type or an object")
+    _check_keys(entry, ("type", "dwell"), f"pages[{index}].")
+    if not isinstance(entry.get("type"), str):
+        raise ConfigError(f"pages[{index}].type must be a string")
+    dwell = entry.get("dwell", 10)
+    if not NON_NEGATIVE[0](dwell):
+        raise ConfigError(f"pages[{index}].dwell must be {NON_NEGATIVE[1]}, got {dwell!r}")
+    return PageSettings(type=entry["type"], dwell=dwell)
+
+def _order_levels(section, settings):
+    """Keep warn <= critical when the config only sets one of them
+
+    Configs from before the critical level only set *_warn; a default
+    critical below it is raised to it (and a lone *_critical below the
+    default warn lowers warn). Only two explicit values are checked.
+    """
+    for prefix, _ in LEVELS.values():
+        warn_key, critical_key = f"{prefix}_warn", f"{prefix}_critical"
+        if critical_key not in section:
+            settings[critical_key] = max(settings[critical_key], settings[warn_key])
+        elif warn_key not in section:
+            settings[warn_key] = min(settings[warn_key], settings[critical_key])
+        elif settings[critical_key] < settings[warn_key]:
+            raise ConfigError(f"thresholds.{critical_key} must be >= "
+                              f"thresholds.{warn_key} ({settings[warn_key]}), got {settings[critical_key]!r}")
+
+def parse_config(user_config):
+    """Check a parsed config.json against the schema and compile it into a Config
+
+    Missing keys take their defaults. Unknown keys, values of the wrong
+    type and impossible values raise ConfigError naming the setting.
+    """
+    if not isinstance(user_config, dict):
+        raise ConfigError("config must be a JSON object")
+    _check_keys(user_config, DEFAULT_CONFIG, "")
+    fields = {}
+    for name in SECTIONS:
+        section = user_config.get(name, {})
+        if not isinstance(section, dict):
+            raise ConfigError(f"{name} must be an object")
+        _check_keys(section, DEFAULT_CONFIG[name], f"{name}.")
+        settings = dict(DEFAULT_CONFIG[name], **section)
+        for key, value in settings.items():
+            check, expected = SCHEMA[name][key]
+            if not check(value):
+                raise ConfigError(f"{name}.{key} must be {expected}, got {value!r}")
+        if name == "thresholds":
+            _order_levels(section, settings)
+        fields[name] = SECTION_CLASSES[name](**{key: freeze(value) for key, value in settings.items()})
+
+    pages = user_config.get("pages", DEFAULT_CONFIG["pages"])
+    if not isinstance(pages, list):
+        raise ConfigError("pages must be a list")
+    fields["pages"] = tuple(_parse_page(entry, index) for index, entry in enumerate(pages))
+    layout = user_config.get("layout", DEFAULT_CONFIG["layout"])
+    if not isinstance(layout, dict):
+        raise ConfigError("layout must be an object")
+    fields["layout"] = freeze(layout)
+
+    thresholds, icons = fields["thresholds"], fields["icons"]
+    levels = {}
+    for metric, (threshold_prefix, icon_prefix) in LEVELS.items():
+        levels[metric] = Level(
+            warn=getattr(thresholds, f"{threshold_prefix}_warn"),
+            critical=getattr(thresholds, f"{threshold_prefix}_critical"),
+            hysteresis=getattr(thresholds, f"{threshold_prefix}_hysteresis"),
+            icons=tuple(getattr(icons, f"{icon_prefix}_{state}") for state in ("normal", "warn", "critical")),
+        )
+    fields["levels"] = Levels(**levels)
+    return Config(**fields)
+
+def read_config(path):
+    """Read config.json into a Config
+
+    Raises OSError if the file cannot be read and ValueError (ConfigError
+    or json.JSONDecodeError) if it is not valid JSON or fails the schema.
+    """
+    with open(path, "r") as f:
+        return parse_config(json.load(f))
+
+def default_config():
+    return parse_config({})
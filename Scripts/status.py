@@ -2,364 +2,1104 @@
 # Displays system stats with dynamic icons and shutdown detection
 # Supports configuration via config.json
 
+import sys
+from profiling import StartupProfiler, StageTimings, ErrorCounts, ProcessStats, HISTOGRAM_BOUNDS
+
+# Start timing before anything heavy is imported (--profile-startup)
+startup = StartupProfiler(enabled="--profile-startup" in sys.argv[1:])
+
+import argparse
+import asyncio
+import functools
+import operator
 import time
-import board
-import busio
-import gpiozero
 import os
 import signal
-import sys
+import socket
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+startup.mark("import stdlib")
 from PIL import Image, ImageDraw, ImageFont
-import adafruit_ssd1306
-import subprocess
+startup.mark("import PIL")
+import collectors
+import netlink
+import glyphs
+import history
+import pages
+import layout
+import watcher
+import settings
+import alerts
+import exporter
+from scheduler import TickScheduler, CollectorScheduler
+# Only the selected backend's hardware modules are imported (in create_backend)
+from display import create_backend, DisplayWriter
+startup.mark("import local modules")
 
 # Get the script directory for relative paths
 SCRIPT_DIR = Path(__file__).parent.resolve()
 PROJECT_DIR = SCRIPT_DIR.parent  # Go up from Scripts/ to project root
 
+# Command line options
+parser = argparse.ArgumentParser(description="OLED stats display for Raspberry Pi")
+parser.add_argument("--debug", action="store_true",
+                    help="print tick jitter statistics (p50/p99 lateness) every minute")
+parser.add_argument("--profile-startup", action="store_true",
+                    help="print an import and initialization time breakdown after the first frame")
+subcommands = parser.add_subparsers(dest="command")
+dump_parser = subcommands.add_parser("dump-history",
+                                     help="print the saved metric history as CSV or JSON and exit")
+dump_parser.add_argument("--format", choices=("csv", "json"), default="csv")
+dump_parser.add_argument("--file", help="history file to read (default: history.path in config.json)")
+args = parser.parse_args()
+DEBUG = args.debug
+DEBUG_INTERVAL = 60
+
+CONFIG_PATH = PROJECT_DIR / "config.json"
+
+def read_config():
+    """Read config.json into a validated, frozen settings.Config"""
+    return settings.read_config(CONFIG_PATH)
+
 def load_config():
-    """Load configuration from config.json"""
-    config_path = PROJECT_DIR / "config.json"
-    
-    # Default configuration
-    default_config = {
-        "display": {
-            "width": 128,
-            "height": 64,
-            "i2c_address": "0x3C",
-            "rotation": 0
-        },
-        "timing": {
-            "refresh_interval": 1.0,
-            "rotation_interval": 3
-        },
-        "fonts": {
-            "text_font": "PixelOperator.ttf",
-            "text_size": 16,
-            "text_size_large": 24,
-            "icon_font": "la-solid-900.ttf",
-            "icon_size": 14
-        },
-        "thresholds": {
-            "load_warn": 2.0,
-            "temp_warn": 70,
-            "mem_warn": 80,
-            "disk_warn": 80
-        },
-        "icons": {
-            "hostname": "\uf108",
-            "wifi": "\uf1eb",
-            "lan": "\uf6ff",
-            "offline": "\uf011",
-            "load_normal": "\uf0e7",
-            "load_warn": "\uf06d",
-            "temp_normal": "\uf2c9",
-            "temp_warn": "\uf06d",
-            "mem_normal": "\uf0ae",
-            "mem_warn": "\uf071",
-            "disk_normal": "\uf0a0",
-            "disk_warn": "\uf071"
-        }
-    }
-    
+    """Load configuration from config.json, using the defaults only if there is none
+
+    A file that cannot be parsed or fails the schema stops the program:
+    running on defaults could drive the panel at the wrong address or rotation.
+    """
     try:
-        with open(config_path, 'r') as f:
-            user_config = json.load(f)
-            # Merge user config with defaults
-            for key in default_config:
-                if key in user_config:
-                    if isinstance(default_config[key], dict):
-                        default_config[key].update(user_config[key])
-                    else:
-                        default_config[key] = user_config[key]
-            return default_config
+        return read_config()
     except FileNotFoundError:
-        print(f"Config file not found at {config_path}, using defaults")
-        return default_config
+        print(f"Config file not found at {CONFIG_PATH}, using defaults")
+        return settings.default_config()
     except json.JSONDecodeError as e:
-        print(f"Error parsing config file: {e}, using defaults")
-        return default_config
+        print(f"Error parsing config file {CONFIG_PATH}: {e}")
+    except (OSError, ValueError) as e:
+        print(f"Invalid config file {CONFIG_PATH}: {e}")
+    sys.exit(1)
 
 # Load configuration
 config = load_config()
+startup.mark("load config")
 
-# Display Parameters
-WIDTH = config["display"]["width"]
-HEIGHT = config["display"]["height"]
-I2C_ADDRESS = int(config["display"]["i2c_address"], 16)
-ROTATION = config["display"]["rotation"]
+if args.command == "dump-history":
+    try:
+        history.dump_history(args.file or config.history.path, args.format, sys.stdout)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read history: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0)
 
 # Timing
-LOOPTIME = config["timing"]["refresh_interval"]
-ROTATION_INTERVAL = config["timing"]["rotation_interval"]
+LOOPTIME = config.timing.refresh_interval
+ROTATION_INTERVAL = config.timing.rotation_interval
+
+def collector_intervals(timing):
+    """Per-collector sampling intervals (seconds, 0 = every refresh)"""
+    return {
+        name: getattr(timing, f"{name}_interval")
+        for name in ("load", "temp", "memory", "disk", "network", "cpu", "throughput", "history")
+    }
+
+COLLECTOR_INTERVALS = collector_intervals(config.timing)
+# Time constant (seconds) of the throughput EWMA
+THROUGHPUT_SMOOTHING = config.timing.throughput_smoothing
+# How long a blocking collector (disk) may take before its result is skipped
+COLLECTOR_TIMEOUT = config.timing.collector_timeout
+
+# Line 2 of the built-in layout shows the load average ("load") or per-core CPU bars ("cpu")
+LINE2_MODE = config.display.line2
+
+# Volumes for the disk line: "/path" or {"path": "/path", "label": "NVMe"}
+DISK_VOLUMES = [
+    (entry, entry) if isinstance(entry, str) else (entry["path"], entry.get("label", entry["path"]))
+    for entry in config.disks.mount_points
+]
+DISK_TTL = config.disks.ttl
 
 # Font paths
 FONTS_DIR = PROJECT_DIR / "Fonts"
-TEXT_FONT_PATH = FONTS_DIR / config["fonts"]["text_font"]
-ICON_FONT_PATH = FONTS_DIR / config["fonts"]["icon_font"]
 
-# Thresholds
-THRESHOLDS = config["thresholds"]
+# Warning thresholds with their (normal, warn) icons, one attribute per metric
+LEVELS = config.levels
 
 # Icons
-ICONS = config["icons"]
+ICONS = config.icons
 
 # Icon width for text offset (will be set after font loads)
 ICON_WIDTH = 0
 
-# Use gpiozero to control the reset pin
-oled_reset_pin = gpiozero.OutputDevice(4, active_high=False)
-
-# Use I2C for communication
-i2c = board.I2C()
-
-# Manually reset the display
-oled_reset_pin.on()
-time.sleep(0.1)
-oled_reset_pin.off()
-time.sleep(0.1)
-oled_reset_pin.on()
+# Create the display backend (SSD1306 panel, or virtual for headless runs)
+try:
+    display = create_backend(config.display)
+except ValueError as e:
+    print(e)
+    sys.exit(1)
+startup.mark(f"init {display.name} backend")
 
-# Create the OLED display object
-oled = adafruit_ssd1306.SSD1306_I2C(WIDTH, HEIGHT, i2c, addr=I2C_ADDRESS)
+# Self-instrumentation: per-stage latency histograms (each collector,
+# layout, rasterize, submit, pack, transfer), errors by stage and
+# exception type, and this process's CPU time and memory
+timings = StageTimings()
+error_counts = ErrorCounts()
+process_stats = ProcessStats()
 
-# Set display rotation
-if ROTATION == 2:
-    try:
-        oled.rotate(2)
-    except AttributeError:
-        oled.rotation = 2
+# Transfers run on their own thread so a slow or NACKing bus never
+# delays collection and rendering; unsent frames are replaced, not queued
+writer = DisplayWriter(display, timings, error_counts)
 
 # Create a blank image for drawing
-image = Image.new("1", (oled.width, oled.height))
+image = Image.new("1", (display.width, display.height))
 draw = ImageDraw.Draw(image)
 
-# Load fonts
+def show_image(dirty=None):
+    """Hand the image (and the rectangle that changed, if known) to the display writer thread"""
+    writer.submit(image, dirty)
+
+@functools.lru_cache(maxsize=None)
+def load_font(path, size):
+    """Load a font face the first time it is needed"""
+    return ImageFont.truetype(str(path), size)
+
+def load_fonts(fonts_config):
+    """Load the text and icon fonts for a fonts config section
+
+    Returns (text_font_path, icon_font_path, font, icon_font), with
+    icon_font None if the icon font is missing (icons are optional).
+    Raises OSError if the text font cannot be loaded.
+    """
+    text_font_path = FONTS_DIR / fonts_config.text_font
+    icon_font_path = FONTS_DIR / fonts_config.icon_font
+    text_font = load_font(text_font_path, fonts_config.text_size)
+    try:
+        icons = load_font(icon_font_path, fonts_config.icon_size)
+    except OSError:
+        print(f"Icon font not found at {icon_font_path}, running without icons")
+        icons = None
+    return text_font_path, icon_font_path, text_font, icons
+
+# Load the main fonts now (the first frame needs them); the large
+# OFFLINE fonts are only loaded if the shutdown screen is shown
 try:
-    font = ImageFont.truetype(str(TEXT_FONT_PATH), config["fonts"]["text_size"])
-    font_large = ImageFont.truetype(str(TEXT_FONT_PATH), config["fonts"]["text_size_large"])
+    TEXT_FONT_PATH, ICON_FONT_PATH, font, icon_font = load_fonts(config.fonts)
 except OSError as e:
     print(f"Error loading text font: {e}")
-    print(f"Tried path: {TEXT_FONT_PATH}")
+    print(f"Tried path: {FONTS_DIR / config.fonts.text_font}")
     sys.exit(1)
-
-# Load icon font (optional - will work without it)
-ICONS_AVAILABLE = False
-icon_font = None
-icon_font_large = None
-try:
-    icon_font = ImageFont.truetype(str(ICON_FONT_PATH), config["fonts"]["icon_size"])
-    icon_font_large = ImageFont.truetype(str(ICON_FONT_PATH), config["fonts"]["text_size_large"])
-    ICONS_AVAILABLE = True
+ICONS_AVAILABLE = icon_font is not None
+if ICONS_AVAILABLE:
     # Calculate icon width for consistent spacing
-    ICON_WIDTH = config["fonts"]["icon_size"] + 2
-    ICON_WIDTH_LARGE = config["fonts"]["text_size_large"] + 2
-except OSError:
-    print(f"Icon font not found at {ICON_FONT_PATH}, running without icons")
-    ICONS_AVAILABLE = False
+    ICON_WIDTH = config.fonts.icon_size + 2
+    ICON_WIDTH_LARGE = config.fonts.text_size_large + 2
+startup.mark("load fonts")
 
 # Get hostname once at startup for use in signal handler
 try:
-    HOSTNAME = subprocess.check_output("hostname", shell=True).decode('utf-8').strip()
-except:
+    HOSTNAME = socket.gethostname() or "Pi"
+except OSError:
     HOSTNAME = "Pi"
 
+# Track interfaces and IPs from kernel netlink events instead of polling `ip addr`
+try:
+    network_table = netlink.InterfaceTable().start()
+except OSError as e:
+    print(f"Netlink unavailable ({e}), showing hostname only")
+    network_table = None
+startup.mark("netlink table")
+
+# (netlink snapshot, network info built from it)
+network_info_cache = [None, []]
+
 def get_network_info():
-    """Get hostname and physical network interfaces with IPs"""
-    info_list = []
-    
-    # Add hostname
-    info_list.append(("hostname", HOSTNAME))
-    
-    # Get physical network interfaces and their IPs
-    try:
-        cmd = "ip -4 -o addr show | awk '!/^[0-9]+: lo/ {print $2, $4}' | cut -d/ -f1"
-        output = subprocess.check_output(cmd, shell=True).decode('utf-8').strip()
-        
-        for line in output.split('\n'):
-            if line:
-                parts = line.split()
-                if len(parts) >= 2:
-                    interface = parts[0]
-                    ip = parts[1]
-                    
-                    # Only include physical interfaces (skip docker, veth, br, tailscale, etc.)
-                    skip_prefixes = ('docker', 'br-', 'veth', 'tailscale', 'tun', 'tap')
-                    if any(interface.startswith(p) for p in skip_prefixes):
-                        continue
-                    
-                    if interface.startswith('eth') or interface.startswith('en'):
-                        info_list.append(("lan", ip))
-                    elif interface.startswith('wlan') or interface.startswith('wl'):
-                        info_list.append(("wifi", ip))
-    except:
-        pass
-    
-    return info_list
+    """Get hostname and physical network interfaces with IPs
+
+    The snapshot tuple is only replaced when the kernel reports a change,
+    so while it is the same object the previous list is returned and the
+    network lines built from it stay cached.
+    """
+    snapshot = network_table.snapshot() if network_table is not None else ()
+    if snapshot is not network_info_cache[0]:
+        network_info_cache[:] = snapshot, [("hostname", HOSTNAME), *snapshot]
+    return network_info_cache[1]
 
-def draw_icon(x, y, icon_key):
-    """Draw an icon at the specified position, return width used"""
-    if ICONS_AVAILABLE and icon_key in ICONS:
-        draw.text((x, y), ICONS[icon_key], font=icon_font, fill=255)
+def format_rate(bytes_per_second):
+    """Format a byte rate compactly, e.g. 512B, 34K, 1.2M"""
+    for unit in ("B", "K", "M"):
+        if bytes_per_second < 1000:
+            break
+        bytes_per_second /= 1024
+    else:
+        unit = "G"
+    if bytes_per_second < 10 and unit != "B":
+        return f"{bytes_per_second:.1f}{unit}"
+    return f"{bytes_per_second:.0f}{unit}"
+
+# Composite text from cached glyph bitmaps instead of rasterizing every frame
+glyph_cache = glyphs.GlyphCache()
+
+def draw_text(x, y, text):
+    """Draw text in the main font at the specified position"""
+    glyph_cache.draw_text(image, draw, (x, y), text, font)
+
+def draw_icon(x, y, icon):
+    """Draw an icon character at the specified position, return width used"""
+    if ICONS_AVAILABLE and icon:
+        glyph_cache.draw_text(image, draw, (x, y), icon, icon_font)
         return ICON_WIDTH
     return 0
 
-def get_icon_for_value(base_name, value, threshold):
-    """Get the appropriate icon based on value vs threshold"""
-    if value >= threshold:
-        return f"{base_name}_warn"
-    return f"{base_name}_normal"
-
 def show_offline_screen():
     """Display an offline message when shutting down"""
-    draw.rectangle((0, 0, oled.width, oled.height), outline=0, fill=0)
+    draw.rectangle((0, 0, display.width, display.height), outline=0, fill=0)
     
-    # Line 1: Hostname
-    draw.text((10, 8), HOSTNAME, font=font, fill=255)
+    if display.height >= 64:
+        # Line 1: Hostname
+        draw.text((10, 8), HOSTNAME, font=font, fill=255)
+        offline_y = 32
+    else:
+        # 128x32 panels only have room for OFFLINE, centered
+        offline_y = (display.height - config.fonts.text_size_large) // 2
     
     # Line 2: Power icon + OFFLINE (both large, same line)
+    font_large = load_font(TEXT_FONT_PATH, config.fonts.text_size_large)
     if ICONS_AVAILABLE:
-        draw.text((10, 32), ICONS["offline"], font=icon_font_large, fill=255)
-        draw.text((10 + ICON_WIDTH_LARGE, 32), "OFFLINE", font=font_large, fill=255)
+        icon_font_large = load_font(ICON_FONT_PATH, config.fonts.text_size_large)
+        draw.text((10, offline_y), ICONS.offline, font=icon_font_large, fill=255)
+        draw.text((10 + ICON_WIDTH_LARGE, offline_y), "OFFLINE", font=font_large, fill=255)
     else:
-        draw.text((10, 32), "OFFLINE", font=font_large, fill=255)
+        draw.text((10, offline_y), "OFFLINE", font=font_large, fill=255)
     
-    oled.image(image)
-    oled.show()
+    # Stop the writer first so the OFFLINE frame is the last one sent
+    writer.close()
+    display.show(image)
 
-def signal_handler(sig, frame):
-    """Handle shutdown signals gracefully"""
+def shutdown():
+    """Show the OFFLINE screen and log stats when asked to stop"""
     try:
         show_offline_screen()
-    except:
-        pass
-    sys.exit(0)
+    except Exception as e:
+        print(f"Cannot show the OFFLINE screen ({type(e).__name__}: {e})")
+    print(f"Display transfer stats: {writer.stats()}")
+    metric_history.close()
 
-# Register signal handlers for graceful shutdown
-signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGINT, signal_handler)
+# No separate clear on startup: the first frame is always sent in full
 
-# Clear the display on startup
-oled.fill(0)
-oled.show()
+# Fire ticks on fixed monotonic deadlines so the cadence does not drift
+scheduler = TickScheduler(LOOPTIME)
 
-# Rotation tracking
-rotation_index = 0
-loop_counter = 0
+# Each collector runs as its own task at its own cadence; blocking calls
+# (statvfs on a hung mount, file writes) go to a small bounded pool under
+# a timeout, so a single stuck source can never stall the display
+# (one worker per volume so a hung NFS mount cannot starve the others)
+collector_executor = ThreadPoolExecutor(max_workers=2 + len(DISK_VOLUMES), thread_name_prefix="collector")
+collector_scheduler = CollectorScheduler(min_interval=LOOPTIME, timings=timings, error_counts=error_counts)
+collector_scheduler.add("network", get_network_info, COLLECTOR_INTERVALS["network"], [])
+collector_scheduler.add("load", collectors.get_load, COLLECTOR_INTERVALS["load"], 0.0)
+collector_scheduler.add("temp", collectors.get_temperature, COLLECTOR_INTERVALS["temp"], 0.0)
+collector_scheduler.add("memory", collectors.get_memory, COLLECTOR_INTERVALS["memory"], (0, 0, 0.0))
+# Disk usage statvfs's every mounted volume with its own timeout and caches results
+disk_collector = collectors.DiskCollector(DISK_VOLUMES, collector_executor,
+                                          timeout=COLLECTOR_TIMEOUT, ttl=DISK_TTL)
+collector_scheduler.add("disk", disk_collector.collect, COLLECTOR_INTERVALS["disk"], (), timeout=None)
+# Per-core CPU bars sample /proc/stat into preallocated arrays
+cpu_stats = collectors.CpuStats()
+collector_scheduler.add("cpu", cpu_stats.sample, COLLECTOR_INTERVALS["cpu"], cpu_stats)
+# RX/TX rates of the lan/wifi interfaces join the line 1 rotation
+throughput = collectors.NetThroughput(netlink.classify_interface, smoothing=THROUGHPUT_SMOOTHING)
+collector_scheduler.add("throughput", throughput.sample, COLLECTOR_INTERVALS["throughput"], ())
+values = collector_scheduler.values
 
-while True:
+# Recent load/temperature/memory samples for the graph screen (fixed size:
+# one float per panel column per metric), also kept in a memory-mapped file
+# so the history survives restarts
+HISTORY_METRICS = ("load", "temp", "memory")
+history_store = None
+if config.history.path:
     try:
-        # Draw a black filled box to clear the image
-        draw.rectangle((0, 0, oled.width, oled.height), outline=0, fill=0)
-
-        # Get network info (hostname + physical IPs only)
-        network_info = get_network_info()
-        
-        # Rotate through network info every ROTATION_INTERVAL seconds
-        if loop_counter >= ROTATION_INTERVAL:
-            rotation_index = (rotation_index + 1) % len(network_info)
-            loop_counter = 0
-        
-        # Get current network info item
-        if network_info:
-            info_type, info_value = network_info[rotation_index % len(network_info)]
-        else:
-            info_type, info_value = "hostname", "No network"
+        history_store = history.HistoryFile(config.history.path, HISTORY_METRICS,
+                                            config.history.samples)
+    except OSError as e:
+        print(f"History file unavailable ({e}), keeping history in memory only")
+metric_history = history.MetricHistory(HISTORY_METRICS, size=display.width, store=history_store)
+startup.mark("history file")
 
-        # Get load average (1-minute)
-        load_raw = subprocess.check_output("cat /proc/loadavg | awk '{print $1}'", shell=True).decode('utf-8').strip()
-        try:
-            load_value = float(load_raw)
-        except:
-            load_value = 0.0
+def record_history():
+    """Append the latest load, temperature and memory samples to their history"""
+    metric_history.record_row(time.time(), (values["load"], values["temp"], values["memory"][2]))
 
-        # Get temperature
-        temp_raw = subprocess.check_output("cat /sys/class/thermal/thermal_zone*/temp 2>/dev/null | head -1", shell=True).decode('utf-8').strip()
-        try:
-            temp_value = float(temp_raw) / 1000
-        except:
-            temp_value = 0.0
+collector_scheduler.add("history", record_history, COLLECTOR_INTERVALS["history"])
+
+# === Threshold levels ===
+# Each new sample goes through its metric's normal/warn/critical state
+# machine (with hysteresis) once, as it is collected. The renderer
+# subscribes to the transitions and keeps the icon each metric shows, so
+# frames neither compare values with thresholds nor look icons up
+level_alerts = alerts.Alerts({metric: getattr(LEVELS, metric).bands for metric in settings.LEVELS})
+
+class LevelIcons:
+    """The icon each single-valued metric is drawn with, following its level"""
+
+    __slots__ = ("load", "cpu", "temp", "memory")
+
+level_icons = LevelIcons()
+# One icon per entry of values["disk"], in the same order
+disk_icons = ()
+
+def reset_level_icons():
+    """Point every metric at the icon of its current state (at startup and when icons change)"""
+    global disk_icons
+    for metric in LevelIcons.__slots__:
+        setattr(level_icons, metric, getattr(LEVELS, metric).icons[level_alerts.machine(metric).state])
+    disk_icons = tuple(LEVELS.disk.icons[level_alerts.machine("disk", disk.label).state]
+                       for disk in values["disk"])
+
+reset_level_icons()
+
+@level_alerts.subscribe
+def show_level_change(event):
+    """Renderer: switch the metric's icon (disks are looked after by update_disk_levels)"""
+    if event.key is None:
+        setattr(level_icons, event.metric, getattr(LEVELS, event.metric).icons[event.state])
+
+@level_alerts.subscribe
+def log_level_change(event):
+    name = event.metric if event.key is None else f"{event.metric} {event.key}"
+    print(f"Level {name}: {alerts.STATE_NAMES[event.previous]} -> "
+          f"{alerts.STATE_NAMES[event.state]} ({event.value:.1f})")
+
+def update_disk_levels(disks):
+    """Run every volume through its own state machine and line up the icons with the results"""
+    global disk_icons
+    icons = LEVELS.disk.icons
+    disk_icons = tuple(icons[level_alerts.update("disk", disk.percent, disk.label)] for disk in disks)
+
+collector_scheduler.subscribe("load", functools.partial(level_alerts.update, "load"))
+collector_scheduler.subscribe("cpu", lambda cpu: level_alerts.update("cpu", cpu.total))
+collector_scheduler.subscribe("temp", functools.partial(level_alerts.update, "temp"))
+collector_scheduler.subscribe("memory", lambda memory: level_alerts.update("memory", memory[2]))
+collector_scheduler.subscribe("disk", update_disk_levels)
+
+# === Pages ===
+# Each page type has a builder that works out its layout once at startup and
+# returns the draw function used every tick, plus the collectors it reads
+
+# Text line positions (one per text_size rows)
+LINE_HEIGHT = config.fonts.text_size
+LINE_Y = tuple(range(0, display.height - LINE_HEIGHT + 1, LINE_HEIGHT))
+
+# (network info, rates, lines) the network lines were last built from
+network_cache = [None, None, []]
+
+def network_lines():
+    """(icon, text) for the hostname and IPs, then an RX/TX line per interface
+
+    Rebuilt only when the network or throughput collector produced a new
+    result, so frames in between reuse the same list.
+    """
+    network_info = values["network"]
+    rates = values["throughput"]
+    if network_info is network_cache[0] and rates is network_cache[1]:
+        return network_cache[2]
+    lines = [(getattr(ICONS, info_type), info_value) for info_type, info_value in network_info]
+    lines.extend(
+        (getattr(ICONS, rate.kind), f"RX {format_rate(rate.rx_bytes)} TX {format_rate(rate.tx_bytes)}")
+        for rate in rates
+    )
+    network_cache[:] = network_info, rates, lines
+    return lines
+
+def visible_window(items, step, count):
+    """Return up to count items, scrolling one per step when they do not all fit"""
+    if len(items) <= count:
+        return items
+    start = step % len(items)
+    return [items[(start + i) % len(items)] for i in range(count)]
+
+def disk_line(disk, with_label):
+    """Return the text for one volume"""
+    text = f"{collectors.human_gb(disk.used)}/{collectors.human_gb(disk.total)}GB {disk.percent:.0f}%"
+    if with_label:
+        text = f"{disk.label} {text}"
+    return text
+
+def cpu_bar_layout(left, top, right, bottom, count):
+    """Return (top, bottom, [(x0, x1), ...]) for count bars between left and right"""
+    bar_width = max(1, (right - left - (count - 1)) // count)
+    columns = []
+    x = left
+    for _ in range(count):
+        if x + bar_width > right:
+            break
+        columns.append((x, x + bar_width - 1))
+        x += bar_width + 1
+    return top, bottom, columns
+
+def draw_cpu_bars(bars, cpu):
+    """Draw one vertical utilization bar per core into a cpu_bar_layout()"""
+    top, bottom, columns = bars
+    height = bottom - top + 1
+    for (x0, x1), percent in zip(columns, cpu.cores):
+        # A 1px floor keeps idle cores visible
+        fill = max(1, round(percent * height / 100))
+        draw.rectangle((x0, bottom - fill + 1, x1, bottom), fill=255)
+
+def text_widget(value, collectors):
+    """Register a text widget: value(step) returns (icon, text)"""
+    return value, None, collectors
+
+def network_widget(step):
+    network_info = network_lines()
+    if network_info:
+        return network_info[step % len(network_info)]
+    return ICONS.hostname, "No network"
+
+def load_widget(step):
+    load_value = values["load"]
+    return level_icons.load, f"{load_value:.2f}"
+
+def cpu_widget(step):
+    # Whole percents per core tell bar frames apart
+    cpu = values["cpu"]
+    return (level_icons.cpu,
+            tuple(int(percent) for percent in cpu.cores))
+
+def make_cpu_painter(op):
+    """Per-core bars filling the cell (laid out once)"""
+    bars = cpu_bar_layout(op.text_x, op.y + 2, op.right - 3, op.y + op.height - 3, cpu_stats.ncpu)
+    return lambda: draw_cpu_bars(bars, values["cpu"])
 
-        # Get memory usage
-        mem_output = subprocess.check_output("free | awk 'NR==2{printf \"%.1f %.1f %.0f\", $3/1024/1024, $2/1024/1024, ($3/$2)*100}'", shell=True).decode('utf-8').strip()
-        mem_parts = mem_output.split()
+def temp_widget(step):
+    temp_value = values["temp"]
+    return level_icons.temp, f"{temp_value:.0f}C"
+
+def memory_widget(step):
+    mem_used, mem_total, mem_percent = values["memory"]
+    return (level_icons.memory,
+            f"{mem_used / collectors.GIB:.1f}/{mem_total / collectors.GIB:.1f}GB {mem_percent:.0f}%")
+
+def memory_percent_widget(step):
+    mem_percent = values["memory"][2]
+    return level_icons.memory, f"{mem_percent:.0f}%"
+
+def disk_widget(step):
+    # Rotates through volumes when there are several
+    disks = values["disk"]
+    if disks:
+        index = step % len(disks)
+        return disk_icons[index], disk_line(disks[index], len(disks) > 1)
+    return LEVELS.disk.icons[alerts.NORMAL], "0/0GB 0%"
+
+def disk_percent_widget(step):
+    disks = values["disk"]
+    if disks:
+        index = step % len(disks)
+        return disk_icons[index], f"{disks[index].percent:.0f}%"
+    return LEVELS.disk.icons[alerts.NORMAL], "0%"
+
+# Widget name -> (value function, painter factory or None, collectors it reads)
+WIDGETS = {
+    "network": text_widget(network_widget, ("network", "throughput")),
+    "load": text_widget(load_widget, ("load",)),
+    "cpu": (cpu_widget, make_cpu_painter, ("cpu",)),
+    "temp": text_widget(temp_widget, ("temp",)),
+    "memory": text_widget(memory_widget, ("memory",)),
+    "memory_percent": text_widget(memory_percent_widget, ("memory",)),
+    "disk": text_widget(disk_widget, ("disk",)),
+    "disk_percent": text_widget(disk_percent_widget, ("disk",)),
+}
+
+def compile_stats_layout(config, icon_width, line2, strict=False):
+    """Compile the configured layout, falling back to the built-in one for this panel
+
+    Configured rows are fonts.text_size tall; the built-in layouts split
+    the panel evenly (16px rows on 128x64 and 128x32), so any text size
+    still fits. With strict=True an invalid layout raises LayoutError instead.
+    """
+    widgets = {name: (value, painter) for name, (value, painter, _) in WIDGETS.items()}
+    if config.layout:
         try:
-            mem_used_gb = mem_parts[0]
-            mem_total_gb = mem_parts[1]
-            mem_percent = float(mem_parts[2])
-        except:
-            mem_used_gb = "0"
-            mem_total_gb = "0"
-            mem_percent = 0
-
-        # Get disk usage
-        disk_output = subprocess.check_output("df -h / | awk 'NR==2{print $3, $2, $5}'", shell=True).decode('utf-8').strip()
-        disk_parts = disk_output.split()
+            return layout.compile_layout(config.layout, display.width, display.height,
+                                         config.fonts.text_size, icon_width, widgets)
+        except (layout.LayoutError, KeyError, TypeError, AttributeError) as e:
+            if strict:
+                raise layout.LayoutError(f"invalid layout: {e}")
+            print(f"Invalid layout in config: {e}, using the built-in {display.height}px layout")
+    built_in = layout.default_layout(display.height, line2)
+    return layout.compile_layout(built_in, display.width, display.height,
+                                 display.height // len(built_in["rows"]), icon_width, widgets)
+
+def stats_collectors(plan):
+    """Collectors read by the widgets of a compiled layout"""
+    return tuple(sorted({name for op in plan for name in WIDGETS[op.widget][2]}))
+
+# Widgets redrawn vs skipped because their output did not change (--debug, per minute)
+widget_counts = {"redrawn": 0, "skipped": 0}
+# Seconds the last draw_layout() spent drawing into the image (the
+# "rasterize" stage; the rest of it, computing widget output, is "layout")
+raster_seconds = 0.0
+
+def draw_layout(plan, step):
+    """Redraw the cells of a compiled layout whose output changed
+
+    Each changed cell is cleared and gets its icon, then its text aligned
+    and trimmed to its budget. Returns the rectangle covering the redrawn
+    cells, or None if nothing changed.
+    """
+    global raster_seconds
+    dirty = None
+    raster = 0.0
+    for op in plan:
+        output = op.value(step)
+        if output == op.last:
+            widget_counts["skipped"] += 1
+            continue
+        op.last = output
+        widget_counts["redrawn"] += 1
+        started = time.monotonic()
+        box = op.box
+        draw.rectangle(box, outline=0, fill=0)
+        dirty = box if dirty is None else (min(dirty[0], box[0]), min(dirty[1], box[1]),
+                                           max(dirty[2], box[2]), max(dirty[3], box[3]))
+        icon, text = output
+        if op.icon_x is not None:
+            draw_icon(op.icon_x, op.y, icon)
+        if op.painter is not None:
+            op.painter()
+        else:
+            width = glyph_cache.text_width(text, font)
+            while width > op.budget and text:
+                text = text[:-1]
+                width = glyph_cache.text_width(text, font)
+            if op.align == "left":
+                x = op.text_x
+            elif op.align == "right":
+                x = op.right - width
+            else:
+                x = op.text_x + (op.budget - width) // 2
+            draw_text(x, op.y, text)
+        raster += time.monotonic() - started
+    raster_seconds = raster
+    return dirty
+
+# The stats page is whatever the layout config describes
+stats_plan = compile_stats_layout(config, ICON_WIDTH if ICONS_AVAILABLE else 0, LINE2_MODE)
+STATS_COLLECTORS = stats_collectors(stats_plan)
+
+def make_stats_page():
+    """The compiled layout (by default network, load + temperature, memory, disk)"""
+    return lambda step: draw_layout(stats_plan, step)
+
+def invalidate_stats_page():
+    layout.invalidate(stats_plan)
+
+def make_network_page():
+    """Hostname, every IP and every interface's throughput, one per line"""
+    text_x = ICON_WIDTH if ICONS_AVAILABLE else 0
+
+    def draw_page(step):
+        for y, (info_type, info_value) in zip(LINE_Y, visible_window(network_lines(), step, len(LINE_Y))):
+            draw_icon(0, y, info_type)
+            draw_text(text_x, y, info_value)
+
+    return draw_page
+
+def make_disks_page():
+    """One line per volume"""
+    text_x = ICON_WIDTH if ICONS_AVAILABLE else 0
+
+    def draw_page(step):
+        disks = values["disk"]
+        for y, index in zip(LINE_Y, visible_window(range(len(disks)), step, len(LINE_Y))):
+            draw_icon(0, y, disk_icons[index])
+            draw_text(text_x, y, disk_line(disks[index], True))
+
+    return draw_page
+
+def make_cpu_page():
+    """Total, iowait and steal on the first line, per-core bars below"""
+    text_x = ICON_WIDTH if ICONS_AVAILABLE else 0
+    bars = cpu_bar_layout(0, LINE_Y[0] + LINE_HEIGHT + 2, display.width, display.height - 1, cpu_stats.ncpu)
+
+    def draw_page(step):
+        cpu = values["cpu"]
+        draw_icon(0, LINE_Y[0], level_icons.cpu)
+        draw_text(text_x, LINE_Y[0], f"{cpu.total:.0f}% io{cpu.iowait:.0f} st{cpu.steal:.0f}")
+        draw_cpu_bars(bars, cpu)
+
+    return draw_page
+
+# (metric, top of the scale or None to fit the data)
+GRAPH_METRICS = (
+    ("load", None),
+    ("temp", 100),
+    ("memory", 100),
+)
+
+def make_graphs_page():
+    """Load, temperature and memory history as stacked sparklines"""
+    band_height = display.height // len(GRAPH_METRICS)
+    # Icons only fit next to the graphs on 64px tall panels
+    show_icons = ICONS_AVAILABLE and band_height >= config.fonts.icon_size
+    graph_x = ICON_WIDTH if show_icons else 0
+    bands = [
+        (metric_history[name], getattr(LEVELS, name).warn, operator.attrgetter(name), top,
+         index * band_height + (band_height - ICON_WIDTH) // 2,
+         (graph_x, index * band_height + 1, display.width - graph_x, band_height - 2))
+        for index, (name, top) in enumerate(GRAPH_METRICS)
+    ]
+
+    def draw_page(step):
+        for buffer, warn, icon, top, icon_y, box in bands:
+            samples = buffer.values()
+            if top is None:
+                top = max(max(samples, default=0.0), warn)
+            if show_icons:
+                draw_icon(0, icon_y, icon(level_icons))
+            history.draw_sparkline(image, draw, box, samples, 0.0, top)
+
+    return draw_page
+
+PAGE_TYPES = {
+    # The stats page reads whatever its compiled layout's widgets need
+    "stats": (make_stats_page, None, invalidate_stats_page),
+    "network": (make_network_page, ("network", "throughput"), None),
+    "disks": (make_disks_page, ("disk",), None),
+    "cpu": (make_cpu_page, ("cpu",), None),
+    "graphs": (make_graphs_page, ("history",), None),
+}
+# The history keeps recording whichever page is visible
+HISTORY_COLLECTORS = ("history", "load", "temp", "memory")
+
+def page_type_errors(page_configs):
+    """Return an error message for each page entry with an unknown type"""
+    return [f"Unknown page type {entry.type!r}, expected one of {', '.join(PAGE_TYPES)}"
+            for entry in page_configs if entry.type not in PAGE_TYPES]
+
+def build_pages(page_configs):
+    """Create the configured pages (settings.PageSettings), skipping unknown types"""
+    for message in page_type_errors(page_configs):
+        print(message)
+    page_list = []
+    for entry in page_configs:
+        if entry.type not in PAGE_TYPES:
+            continue
+        builder, needs, invalidate = PAGE_TYPES[entry.type]
+        page_list.append(pages.Page(entry.type, builder(), STATS_COLLECTORS if needs is None else needs,
+                                    entry.dwell, invalidate))
+    if not page_list:
+        builder, _, invalidate = PAGE_TYPES["stats"]
+        page_list.append(pages.Page("stats", builder(), STATS_COLLECTORS, 10, invalidate))
+    return page_list
+
+# Only the visible page's collectors (plus the history feeds) run
+page_rotation = pages.PageRotation(build_pages(config.pages), collector_scheduler.set_active,
+                                   always=HISTORY_COLLECTORS, min_dwell=LOOPTIME)
+startup.mark("build pages")
+
+# === Prometheus exporter ===
+# Optional: the latest collected values in Prometheus text format, on a
+# loopback HTTP listener and/or as a node_exporter textfile. Both read
+# `values` as they are; a scrape never runs a collector
+
+METRICS_PREFIX = "oled_status_"
+
+def metric_families():
+    """Metric families for the exporter, from the values already in memory"""
+    mem_used, mem_total, mem_percent = values["memory"]
+    disks = values["disk"]
+    rates = values["throughput"]
+    yield "load1", "gauge", "1-minute load average", [((), values["load"])]
+    yield "temperature_celsius", "gauge", "CPU temperature", [((), values["temp"])]
+    yield "memory_used_percent", "gauge", "Memory in use (MemTotal - MemAvailable)", [((), mem_percent)]
+    yield "memory_used_bytes", "gauge", "Memory in use (MemTotal - MemAvailable)", [((), mem_used)]
+    yield "memory_total_bytes", "gauge", "Total memory (MemTotal)", [((), mem_total)]
+    yield ("filesystem_used_percent", "gauge", "Volume usage like df Use%",
+           [((("volume", disk.label),), disk.percent) for disk in disks])
+    yield ("filesystem_size_bytes", "gauge", "Volume size",
+           [((("volume", disk.label),), disk.total) for disk in disks])
+    yield ("filesystem_free_bytes", "gauge", "Space available to users",
+           [((("volume", disk.label),), disk.free) for disk in disks])
+    yield ("network_receive_bytes_per_second", "gauge", "Smoothed receive rate",
+           [((("interface", rate.name), ("kind", rate.kind)), rate.rx_bytes) for rate in rates])
+    yield ("network_transmit_bytes_per_second", "gauge", "Smoothed transmit rate",
+           [((("interface", rate.name), ("kind", rate.kind)), rate.tx_bytes) for rate in rates])
+    if collector_scheduler.runs["cpu"]:
+        cpu = values["cpu"]
+        yield "cpu_busy_percent", "gauge", "Share of all CPU time busy", [((), cpu.total)]
+        yield "cpu_iowait_percent", "gauge", "Share of all CPU time in iowait", [((), cpu.iowait)]
+        yield "cpu_steal_percent", "gauge", "Share of all CPU time stolen by the hypervisor", [((), cpu.steal)]
+        yield ("cpu_core_busy_percent", "gauge", "Per-core busy share",
+               [((("core", str(index)),), percent) for index, percent in enumerate(cpu.cores)])
+    yield ("level", "gauge", "Threshold level: 0 normal, 1 warn, 2 critical",
+           [((("metric", metric), ("key", key or "")), machine.state)
+            for (metric, key), machine in level_alerts.machines.items()])
+    now = time.monotonic()
+    yield ("collector_age_seconds", "gauge",
+           "Seconds since the collector's last good result (collectors pause with the pages that need them)",
+           [((("collector", name),), now - updated)
+            for name, updated in collector_scheduler.updated.items() if updated is not None])
+    yield ("collector_runs_total", "counter", "Successful collector runs",
+           [((("collector", name),), count) for name, count in collector_scheduler.runs.items()])
+    yield ("collector_errors_total", "counter", "Collector runs that raised",
+           [((("collector", name),), count) for name, count in collector_scheduler.errors.items()])
+    yield ("collector_timeouts_total", "counter", "Collector runs that timed out",
+           [((("collector", name),), count) for name, count in collector_scheduler.timeouts.items()])
+    yield "stage_seconds", "histogram", "Latency of each render loop and collector stage", stage_samples()
+    yield ("errors_total", "counter", "Exceptions by stage and type",
+           [((("stage", stage), ("type", kind)), count) for (stage, kind), count in error_counts.counts.items()])
+    yield ("frames_total", "counter", "Frames by outcome",
+           [((("result", result),), count) for result, count in frame_counts().items()])
+    yield ("process_cpu_seconds_total", "counter", "User and system CPU time of this process",
+           [((), process_stats.cpu_seconds())])
+    yield "process_resident_memory_bytes", "gauge", "Resident memory of this process", [((), process_stats.rss_bytes())]
+
+def stage_samples():
+    """The _bucket, _sum and _count samples of every stage's latency histogram"""
+    bounds = [*map(str, HISTOGRAM_BOUNDS), "+Inf"]
+    for stage, (cumulative, total, count) in timings.histograms().items():
+        for bound, seen in zip(bounds, cumulative):
+            yield "_bucket", (("stage", stage), ("le", bound)), seen
+        yield "_sum", (("stage", stage),), total
+        yield "_count", (("stage", stage),), count
+
+def render_metrics():
+    return exporter.render(metric_families(), METRICS_PREFIX)
+
+async def start_exporter():
+    """Start the configured exporters, return (server or None, textfile writer or None, task or None)"""
+    server = textfile = task = None
+    if config.exporter.listen:
+        host, port = settings.split_listen(config.exporter.listen)
         try:
-            disk_used = disk_parts[0].rstrip('G')
-            disk_total = disk_parts[1].rstrip('G')
-            disk_percent = float(disk_parts[2].rstrip('%'))
-        except:
-            disk_used = "0"
-            disk_total = "0"
-            disk_percent = 0
-
-        # Line positions
-        line1_y = 0
-        line2_y = 16
-        line3_y = 32
-        line4_y = 48
-
-        # === LINE 1: Network info (rotating) ===
-        x = 0
-        if ICONS_AVAILABLE:
-            x += draw_icon(x, line1_y, info_type)
-        draw.text((x, line1_y), info_value, font=font, fill=255)
-
-        # === LINE 2: Load + Temperature ===
-        x = 0
-        load_icon = get_icon_for_value("load", load_value, THRESHOLDS["load_warn"])
-        if ICONS_AVAILABLE:
-            x += draw_icon(x, line2_y, load_icon)
-        draw.text((x, line2_y), f"{load_value:.2f}", font=font, fill=255)
-        
-        # Temperature on right side of line 2
-        temp_icon = get_icon_for_value("temp", temp_value, THRESHOLDS["temp_warn"])
-        temp_str = f"{temp_value:.0f}C"
-        if ICONS_AVAILABLE:
-            # Position: right-align temp with icon
-            temp_x = 75
-            draw_icon(temp_x, line2_y, temp_icon)
-            draw.text((temp_x + ICON_WIDTH, line2_y), temp_str, font=font, fill=255)
+            server = await exporter.MetricsServer(render_metrics, host, port).start()
+            print(f"Serving metrics on http://{config.exporter.listen}/metrics")
+        except OSError as e:
+            print(f"Cannot listen on {config.exporter.listen} for metrics: {e}")
+            server = None
+    if config.exporter.textfile:
+        textfile = exporter.TextfileWriter(render_metrics, config.exporter.textfile,
+                                           config.exporter.textfile_interval)
+        task = asyncio.create_task(textfile.run(collector_executor))
+    return server, textfile, task
+
+# === Self-instrumentation ===
+# The display's own health: stage latencies, errors, frame counts and
+# process CPU/memory, dumped to the log on SIGUSR1 and optionally written
+# as JSON to instrumentation.status_file
+
+# Frames of the render loop: "rendered" were handed to the writer,
+# "unchanged" were not sent because no widget changed
+render_frames = {"rendered": 0, "unchanged": 0}
+
+def frame_counts():
+    """Frames by outcome, from the render loop, the writer and the backend"""
+    sent = writer.stats()
+    return {
+        **render_frames,
+        "dropped": sent["frames_dropped"],  # replaced by a newer frame before the writer got to them
+        "written": sent["frames_written"],
+        "identical": sent.get("frames_skipped", 0),  # written but matched the panel contents
+        "failed": sent["write_errors"],
+    }
+
+def instrumentation_snapshot():
+    """Everything the display knows about its own health, as a JSON-ready dict"""
+    now = time.monotonic()
+    return {
+        "time": round(time.time(), 3),
+        "process": process_stats.sample(),
+        "frames": frame_counts(),
+        "stages": timings.stats(),
+        "errors": error_counts.stats(),
+        "last_errors": {f"{stage}:{kind}": message for (stage, kind), message in error_counts.messages.items()},
+        "collectors": {
+            name: {
+                "runs": collector_scheduler.runs[name],
+                "errors": collector_scheduler.errors[name],
+                "timeouts": collector_scheduler.timeouts[name],
+                "age_seconds": None if updated is None else round(now - updated, 3),
+            }
+            for name, updated in collector_scheduler.updated.items()
+        },
+        "active_collectors": collector_scheduler.active(),
+        "ticks": scheduler.stats(),
+        "pages": page_rotation.stats(),
+        "levels": level_alerts.stats(),
+    }
+
+def render_status():
+    return json.dumps(instrumentation_snapshot(), indent=2) + "\n"
+
+def dump_status():
+    """Print the instrumentation snapshot (SIGUSR1)"""
+    print(f"Status: {json.dumps(instrumentation_snapshot())}")
+    sys.stdout.flush()
+
+def start_status_file():
+    """Start rewriting the status file if one is configured, return (writer, task) or (None, None)"""
+    if not config.instrumentation.status_file:
+        return None, None
+    status_file = exporter.TextfileWriter(render_status, config.instrumentation.status_file,
+                                          config.instrumentation.status_interval)
+    return status_file, asyncio.create_task(status_file.run(collector_executor))
+
+# === Config hot reload ===
+# config.json is watched with inotify; a new file is parsed and validated
+# off the event loop, then swapped in between two frames. Only the parts
+# built from changed sections are rebuilt, and a bad edit is rejected
+# with the running config left untouched
+
+# Wait for an editor to finish writing before re-reading the file
+CONFIG_RELOAD_DELAY = 0.25
+# Settings that are only read at startup
+RESTART_SECTIONS = ("disks", "history", "exporter", "instrumentation")
+RESTART_DISPLAY_KEYS = ("width", "height", "i2c_address", "rotation", "backend",
+                        "virtual_output", "virtual_format")
+
+def apply_config(new_config):
+    """Swap in a validated config snapshot, rebuilding only what changed
+
+    Everything that can fail (fonts, layout, pages) is built before any
+    global is replaced, so an exception leaves the running config as is.
+    Returns the names of the changed sections.
+    """
+    global config, LEVELS, ICONS, LINE2_MODE, LOOPTIME, ROTATION_INTERVAL
+    global COLLECTOR_INTERVALS, THROUGHPUT_SMOOTHING
+    global TEXT_FONT_PATH, ICON_FONT_PATH, font, icon_font, ICONS_AVAILABLE, ICON_WIDTH, ICON_WIDTH_LARGE
+    global LINE_HEIGHT, LINE_Y, stats_plan, STATS_COLLECTORS, page_rotation
+
+    changed = new_config.changed(config)
+    if not changed:
+        return changed
+    for section in RESTART_SECTIONS:
+        if section in changed:
+            print(f"Config: {section} changes take effect after a restart")
+    if "display" in changed and any(getattr(new_config.display, key) != getattr(config.display, key)
+                                    for key in RESTART_DISPLAY_KEYS):
+        print("Config: display hardware changes take effect after a restart")
+
+    # Fonts only when their settings changed
+    fonts = None
+    if "fonts" in changed:
+        fonts = load_fonts(new_config.fonts)
+        icons_available = fonts[3] is not None
+    else:
+        icons_available = ICONS_AVAILABLE
+    icon_width = new_config.fonts.icon_size + 2 if icons_available else 0
+    line2 = new_config.display.line2
+
+    # Unknown page types are rejected here rather than skipped
+    errors = page_type_errors(new_config.pages)
+    if errors:
+        raise ValueError(errors[0])
+
+    # The layout only when the geometry (layout, fonts, line 2 widget) changed
+    plan = None
+    if "layout" in changed or "fonts" in changed or line2 != LINE2_MODE:
+        plan = compile_stats_layout(new_config, icon_width, line2, strict=True)
+
+    # Swap in the new snapshot (runs on the event loop, so never mid-frame)
+    config = new_config
+    LEVELS = config.levels
+    ICONS = config.icons
+    network_cache[:] = None, None, []
+    if "thresholds" in changed:
+        level_alerts.configure({metric: getattr(LEVELS, metric).bands for metric in settings.LEVELS})
+    if "thresholds" in changed or "icons" in changed:
+        reset_level_icons()
+    LINE2_MODE = line2
+    if fonts is not None:
+        TEXT_FONT_PATH, ICON_FONT_PATH, font, icon_font = fonts
+        ICONS_AVAILABLE = icons_available
+        ICON_WIDTH = icon_width
+        ICON_WIDTH_LARGE = config.fonts.text_size_large + 2
+        LINE_HEIGHT = config.fonts.text_size
+        LINE_Y = tuple(range(0, display.height - LINE_HEIGHT + 1, LINE_HEIGHT))
+    if plan is not None:
+        stats_plan = plan
+        STATS_COLLECTORS = stats_collectors(plan)
+    if "timing" in changed:
+        LOOPTIME = config.timing.refresh_interval
+        ROTATION_INTERVAL = config.timing.rotation_interval
+        COLLECTOR_INTERVALS = collector_intervals(config.timing)
+        THROUGHPUT_SMOOTHING = config.timing.throughput_smoothing
+        scheduler.interval = LOOPTIME
+        collector_scheduler.min_interval = LOOPTIME
+        for name, interval in COLLECTOR_INTERVALS.items():
+            collector_scheduler.set_interval(name, interval)
+        throughput.smoothing = THROUGHPUT_SMOOTHING
+        page_rotation.min_dwell = LOOPTIME
+
+    # Pages bake in fonts, icon widths, the stats layout and (graphs) the warn
+    # thresholds; they are only rebuilt when one of those changed, and keep
+    # their place in the rotation unless the page list itself changed
+    if ("pages" in changed or fonts is not None or plan is not None or
+            ("thresholds" in changed and any(entry.type == "graphs" for entry in config.pages))):
+        previous = page_rotation
+        page_rotation = pages.PageRotation(build_pages(config.pages), collector_scheduler.set_active,
+                                           always=HISTORY_COLLECTORS, min_dwell=LOOPTIME)
+        if "pages" in changed:
+            page_rotation.start()
         else:
-            draw.text((80, line2_y), temp_str, font=font, fill=255)
-
-        # === LINE 3: Memory ===
-        x = 0
-        mem_icon = get_icon_for_value("mem", mem_percent, THRESHOLDS["mem_warn"])
-        if ICONS_AVAILABLE:
-            x += draw_icon(x, line3_y, mem_icon)
-        mem_display = f"{mem_used_gb}/{mem_total_gb}GB {mem_percent:.0f}%"
-        draw.text((x, line3_y), mem_display, font=font, fill=255)
-
-        # === LINE 4: Disk ===
-        x = 0
-        disk_icon = get_icon_for_value("disk", disk_percent, THRESHOLDS["disk_warn"])
-        if ICONS_AVAILABLE:
-            x += draw_icon(x, line4_y, disk_icon)
-        disk_display = f"{disk_used}/{disk_total}GB {disk_percent:.0f}%"
-        draw.text((x, line4_y), disk_display, font=font, fill=255)
-
-        # Display the image
-        oled.image(image)
-        oled.show()
-
-        loop_counter += 1
+            page_rotation.take_over(previous)
+    return changed
 
-    except Exception as e:
-        # Silently continue on errors
-        pass
+async def reload_config():
+    """Re-read config.json and apply it, keeping the running config if it is bad"""
+    loop = asyncio.get_running_loop()
+    try:
+        new_config = await loop.run_in_executor(collector_executor, read_config)
+    except (OSError, ValueError) as e:
+        print(f"Config reload failed ({e}), keeping the running config")
+        return
+    try:
+        changed = apply_config(new_config)
+    except (OSError, ValueError) as e:
+        print(f"Config reload failed ({e}), keeping the running config")
+        return
+    if changed:
+        print(f"Config reloaded: {', '.join(changed)} changed")
+
+def watch_config(loop):
+    """Reload config.json shortly after it is rewritten, return the watcher (or None)"""
+    try:
+        config_watcher = watcher.FileWatcher(CONFIG_PATH)
+    except (OSError, AttributeError) as e:
+        print(f"Config hot reload unavailable ({e})")
+        return None
+    pending = None
+
+    def on_event():
+        nonlocal pending
+        if config_watcher.read():
+            if pending is not None:
+                pending.cancel()
+            pending = loop.call_later(CONFIG_RELOAD_DELAY, lambda: loop.create_task(reload_config()))
+
+    loop.add_reader(config_watcher.fd, on_event)
+    return config_watcher
+
+async def render_loop():
+    """Draw the visible page from the latest collector results every refresh interval"""
+    # Line rotation (IPs, disks) in real seconds, independent of how long a tick takes
+    rotation_step = 0
+    next_rotation = time.monotonic() + ROTATION_INTERVAL
+    next_debug_report = time.monotonic() + DEBUG_INTERVAL
+    shown_page = None
+    # Unchanged frames as of the last --debug report
+    reported_unchanged = 0
+
+    while True:
+        await scheduler.wait_async()
+        now = time.monotonic()
+
+        if DEBUG and now >= next_debug_report:
+            print(f"Tick jitter: {scheduler.stats()}")
+            print(f"Stage timings: {timings.stats()}")
+            print(f"Errors: {error_counts.stats()}, frames: {frame_counts()}")
+            print(f"Process: {process_stats.sample()}")
+            print(f"Collector timeouts: {collector_scheduler.timeouts}, disk: {disk_collector.timeouts}")
+            print(f"Pages: {page_rotation.stats()}, active collectors: {collector_scheduler.active()}")
+            print(f"Levels: {level_alerts.stats()}")
+            if "cpu" in collector_scheduler.active():
+                print(f"CPU: {cpu_stats.total:.1f}% busy, {cpu_stats.iowait:.1f}% iowait, "
+                      f"{cpu_stats.steal:.1f}% steal, cores {[round(c, 1) for c in cpu_stats.cores]}")
+            print(f"Widgets in the last minute: {widget_counts}, "
+                  f"unchanged frames: {render_frames['unchanged'] - reported_unchanged}")
+            widget_counts["redrawn"] = widget_counts["skipped"] = 0
+            reported_unchanged = render_frames["unchanged"]
+            next_debug_report = now + DEBUG_INTERVAL
+
+        try:
+            # Rotate IPs and volumes every ROTATION_INTERVAL seconds
+            if now >= next_rotation:
+                rotation_step += 1
+                next_rotation = now + ROTATION_INTERVAL
+
+            page = page_rotation.current(now)
+
+            # Start from a cleared image on a page switch and for pages
+            # that do not redraw incrementally
+            full = page is not shown_page or page.invalidate is None
+            if full:
+                # Draw a black filled box to clear the image
+                draw.rectangle((0, 0, display.width, display.height), outline=0, fill=0)
+                if page.invalidate is not None:
+                    page.invalidate()
+                shown_page = page
+            started = time.monotonic()
+            dirty = page.draw(rotation_step)
+            drawn = time.monotonic()
+
+            # Incremental pages time their drawing; whole-page draws are all rasterizing
+            if page.invalidate is None:
+                timings.record("layout", started - now)
+                timings.record("rasterize", drawn - started)
+            else:
+                timings.record("layout", drawn - now - raster_seconds)
+                if full or dirty is not None:
+                    timings.record("rasterize", raster_seconds)
+
+            # Display the image (only the changed part, if anything changed)
+            if full or dirty is not None:
+                show_image(None if full else dirty)
+                timings.record("submit", time.monotonic() - drawn)
+                render_frames["rendered"] += 1
+            else:
+                render_frames["unchanged"] += 1
+
+            if scheduler.ticks == 1 and startup.enabled:
+                writer.flush(timeout=5)
+                startup.mark("first frame")
+                startup.report()
+
+        except Exception as e:
+            # Keep the display running; each kind of error is logged once, then counted
+            if error_counts.record("render", e):
+                print(f"Render failed ({type(e).__name__}: {e}), counting further failures")
+
+async def main():
+    """Run the collectors and the renderer until SIGTERM/SIGINT"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    # Register signal handlers for graceful shutdown
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    # kill -USR1 prints the instrumentation snapshot to the log
+    loop.add_signal_handler(signal.SIGUSR1, dump_status)
+
+    # Give the first round a moment so the first frame has real values,
+    # but never hold the display back for a slow source (only the first
+    # page's collectors start out running)
+    page_rotation.start()
+    await collector_scheduler.start(first_timeout=0.25)
+    config_watcher = watch_config(loop)
+    metrics_server, metrics_textfile, textfile_task = await start_exporter()
+    status_file, status_task = start_status_file()
+    startup.mark("first collection")
+    renderer = asyncio.create_task(render_loop())
+    await stop.wait()
+
+    renderer.cancel()
+    collector_scheduler.stop()
+    if config_watcher is not None:
+        loop.remove_reader(config_watcher.fd)
+        config_watcher.close()
+    if metrics_server is not None:
+        metrics_server.close()
+    if textfile_task is not None:
+        textfile_task.cancel()
+        await metrics_textfile.remove()
+    if status_task is not None:
+        status_task.cancel()
+        await status_file.remove()
+    shutdown()
+
+asyncio.run(main())
 
-    time.sleep(LOOPTIME)
\ No newline at end of file
+collector_executor.shutdown(wait=False, cancel_futures=True)
+if disk_collector.stuck():
+    # A worker stuck in a hung syscall would block interpreter exit forever
+    sys.stdout.flush()
+    os._exit(0)
@@ -0,0 +1,60 @@
+# inotify file watch for the OLED stats display
+# Watches the file's directory rather than the file itself, so editors that
+# save by writing a new file and renaming it over the old one are noticed too
+
+import ctypes
+import os
+import struct
+from pathlib import Path
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len, then len bytes of NUL-padded name
+EVENT = struct.Struct("=iIII")
+
+class FileWatcher:
+    """Non-blocking inotify fd that reports when one file has been rewritten
+
+    Register `fd` with the event loop (loop.add_reader) and call `read()`
+    when it is readable.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        self.path = path
+        self.name = os.fsencode(path.name)
+        self.changes = 0
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if libc.inotify_add_watch(fd, os.fsencode(path.parent), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno), str(path.parent))
+        self.fd = fd
+
+    def read(self):
+        """Drain pending events, return True if any of them was for the file"""
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + EVENT.size <= len(data):
+                _, _, _, length = EVENT.unpack_from(data, offset)
+                start = offset + EVENT.size
+                if data[start:start + length].rstrip(b"\0") == self.name:
+                    changed = True
+                    self.changes += 1
+                offset = start + length
+
+    def close(self):
+        os.close(self.fd)
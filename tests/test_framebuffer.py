@@ -0,0 +1,72 @@
+# Tests for the numpy SSD1306 page packer
+# Every packed frame must be byte-identical to the driver's MVLSB layout
+
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+import framebuffer
+
+def mvlsb_reference(img, rotation):
+    """Pack img pixel by pixel the way adafruit_framebuf's MVLSB image() does"""
+    width, height = img.size
+    buf = bytearray(width * height // 8)
+    pixels = img.load()
+    for x in range(width):
+        for y in range(height):
+            if pixels[x, y]:
+                px, py = (width - 1 - x, height - 1 - y) if rotation == 2 else (x, y)
+                buf[(py >> 3) * width + px] |= 1 << (py & 0x07)
+    return buf
+
+def random_images(width, height, count=6, seed=0):
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.new("1", (width, height))
+        draw = ImageDraw.Draw(img)
+        for _ in range(60):
+            draw.point((rng.randrange(width), rng.randrange(height)), fill=1)
+        draw.rectangle((rng.randrange(width), rng.randrange(height), width - 1, height - 1), outline=1)
+        draw.text((rng.randrange(width // 2), rng.randrange(height // 2)), "12.34", fill=1)
+        images.append(img)
+    # Edge cases: blank, all set, a single corner pixel
+    images.append(Image.new("1", (width, height)))
+    images.append(Image.new("1", (width, height), 1))
+    corner = Image.new("1", (width, height))
+    corner.putpixel((width - 1, height - 1), 1)
+    images.append(corner)
+    return images
+
+@pytest.mark.parametrize("width, height", [(128, 64), (128, 32)])
+@pytest.mark.parametrize("rotation", [0, 2])
+def test_pack_matches_mvlsb(width, height, rotation):
+    packer = framebuffer.PagePacker(width, height, rotation)
+    buf = bytearray(width * height // 8)
+    for img in random_images(width, height):
+        packer.pack_into(img, buf)
+        assert buf == mvlsb_reference(img, rotation)
+
+def test_unsupported_geometry():
+    with pytest.raises(ValueError):
+        framebuffer.PagePacker(128, 30)
+    with pytest.raises(ValueError):
+        framebuffer.PagePacker(128, 64, rotation=1)
+
+@pytest.mark.parametrize("rotation", [0, 2])
+def test_dirty_window_covers_the_packed_change(rotation):
+    width, height = 128, 64
+    packer = framebuffer.PagePacker(width, height, rotation)
+    before = Image.new("1", (width, height))
+    after = before.copy()
+    rect = (0, 16, 74, 31)
+    ImageDraw.Draw(after).rectangle(rect, fill=1)
+    old, new = packer.pack(before), packer.pack(after)
+    page0, page1, col0, col1 = framebuffer.dirty_window(rect, width, height, rotation)
+    changed = (old != new).nonzero()
+    assert changed[0].min() >= page0 and changed[0].max() <= page1
+    assert changed[1].min() >= col0 and changed[1].max() <= col1
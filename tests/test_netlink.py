@@ -0,0 +1,132 @@
+# Tests for the rtnetlink interface table
+# Recorded kernel messages are replayed through one end of a socketpair, so
+# the parser runs exactly as it does on the netlink socket
+
+import socket
+import struct
+
+import pytest
+
+import netlink
+
+# RTM_NEWADDR dump recorded from the kernel: lo 127.0.0.1/8 and eth0 192.0.2.2/24
+# (IFA_ADDRESS, IFA_LOCAL, IFA_BROADCAST, IFA_LABEL, IFA_FLAGS, IFA_CACHEINFO)
+NEWADDR_DUMP = bytes.fromhex(
+    "4c0000001400020003000000ff670000020880fe01000000080001007f000001080002007f000001"
+    "070003006c6f0000080008008000000014000600ffffffffffffffff1000000010000000"
+    "580000001400020003000000ff670000021880000400000008000100c000020208000200c0000202"
+    "08000400c00002ff090003006574683000000000080008008000000014000600ffffffffffffffff"
+    "1000000010000000"
+)
+# Offset of the second message (eth0) in NEWADDR_DUMP
+ETH0_ADDR = 0x4C
+IFLA_MTU = 4
+
+def message(msg_type, body, seq=0):
+    header = netlink.NLMSGHDR.pack(netlink.NLMSGHDR.size + len(body), msg_type, 0, seq, 0)
+    data = header + body
+    return data + bytes(-len(data) % 4)
+
+def attr(attr_type, payload):
+    data = netlink.RTATTR.pack(netlink.RTATTR.size + len(payload), attr_type) + payload
+    return data + bytes(-len(data) % 4)
+
+def link(index, name, msg_type=netlink.RTM_NEWLINK):
+    """An RTM_NEWLINK/RTM_DELLINK with IFLA_MTU ahead of IFLA_IFNAME, as the kernel sends them"""
+    body = netlink.IFINFOMSG.pack(socket.AF_UNSPEC, 1, index, 0x11043, 0)
+    body += attr(IFLA_MTU, struct.pack("=I", 1500)) + attr(netlink.IFLA_IFNAME, name.encode() + b"\0")
+    return message(msg_type, body)
+
+def done():
+    return message(netlink.NLMSG_DONE, struct.pack("=i", 0))
+
+def as_deladdr(newaddr):
+    """The kernel's RTM_DELADDR carries the same payload as the RTM_NEWADDR it undoes"""
+    return newaddr[:4] + struct.pack("=H", netlink.RTM_DELADDR) + newaddr[6:]
+
+@pytest.fixture
+def pair():
+    # SOCK_SEQPACKET keeps message boundaries like netlink datagrams
+    table_end, kernel_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    yield netlink.InterfaceTable(sock=table_end), kernel_end
+    table_end.close()
+    kernel_end.close()
+
+def loaded(pair):
+    table, kernel = pair
+    kernel.send(link(1, "lo") + link(4, "eth0") + link(5, "wlan0") + link(6, "docker0") + done())
+    kernel.send(NEWADDR_DUMP)
+    kernel.send(done())
+    table.resync()
+    return table, kernel
+
+def test_resync_requests_both_dumps_and_builds_the_table(pair):
+    table, kernel = loaded(pair)
+    requests = [netlink.NLMSGHDR.unpack_from(kernel.recv(4096)) for _ in range(2)]
+    assert [(msg_type, flags) for _, msg_type, flags, _, _ in requests] == [
+        (netlink.RTM_GETLINK, netlink.NLM_F_REQUEST | netlink.NLM_F_DUMP),
+        (netlink.RTM_GETADDR, netlink.NLM_F_REQUEST | netlink.NLM_F_DUMP),
+    ]
+    assert table.links == {1: "lo", 4: "eth0", 5: "wlan0", 6: "docker0"}
+    assert table.addrs == {1: ["127.0.0.1"], 4: ["192.0.2.2"]}
+    # lo is not shown
+    assert table.snapshot() == (("lan", "192.0.2.2"),)
+
+def test_events_update_the_snapshot(pair):
+    table, kernel = loaded(pair)
+    # Point the recorded eth0 address at wlan0 (ifa_index) with another IP
+    wlan0_addr = bytearray(NEWADDR_DUMP[ETH0_ADDR:])
+    struct.pack_into("=i", wlan0_addr, netlink.NLMSGHDR.size + 4, 5)
+    wlan0_addr = bytes(wlan0_addr).replace(socket.inet_aton("192.0.2.2"), socket.inet_aton("192.0.2.9"))
+
+    kernel.send(wlan0_addr)
+    assert not table.handle(table.sock.recv(table.RECV_SIZE))
+    assert table.snapshot() == (("lan", "192.0.2.2"), ("wifi", "192.0.2.9"))
+    events = table.events
+
+    # A repeated address is not a change
+    kernel.send(wlan0_addr)
+    table.handle(table.sock.recv(table.RECV_SIZE))
+    assert table.events == events
+
+    kernel.send(as_deladdr(NEWADDR_DUMP[ETH0_ADDR:]))
+    table.handle(table.sock.recv(table.RECV_SIZE))
+    assert table.snapshot() == (("wifi", "192.0.2.9"),)
+    assert 4 not in table.addrs
+
+    kernel.send(link(5, "wlan0", netlink.RTM_DELLINK))
+    table.handle(table.sock.recv(table.RECV_SIZE))
+    assert table.snapshot() == ()
+    assert 5 not in table.links and 5 not in table.addrs
+
+def test_rename_and_unknown_messages(pair):
+    table, kernel = loaded(pair)
+    # eth0 renamed to a bridge name is no longer shown
+    kernel.send(link(4, "br-lan"))
+    table.handle(table.sock.recv(table.RECV_SIZE))
+    assert table.snapshot() == ()
+
+    # IPv6 addresses and messages of other types are ignored
+    ipv6 = message(netlink.RTM_NEWADDR, netlink.IFADDRMSG.pack(socket.AF_INET6, 64, 0, 0, 4)
+                   + attr(netlink.IFA_ADDRESS, bytes(16)))
+    events = table.events
+    kernel.send(ipv6 + message(24, bytes(12)))
+    assert not table.handle(table.sock.recv(table.RECV_SIZE))
+    assert table.events == events
+
+def test_truncated_header_stops_parsing(pair):
+    table, _ = pair
+    bogus = netlink.NLMSGHDR.pack(8, netlink.RTM_NEWLINK, 0, 0, 0)
+    assert not table.handle(bogus + link(7, "eth1"))
+    assert table.links == {}
+
+def test_error_ends_a_dump(pair):
+    table, _ = pair
+    assert table.handle(message(netlink.NLMSG_ERROR, struct.pack("=i", -16) + bytes(16)))
+
+@pytest.mark.parametrize("name, kind", [
+    ("eth0", "lan"), ("enp1s0", "lan"), ("wlan0", "wifi"), ("wlp2s0", "wifi"),
+    ("lo", None), ("docker0", None), ("veth12ab", None), ("tailscale0", None), ("can0", None),
+])
+def test_classify_interface(name, kind):
+    assert netlink.classify_interface(name) == kind
@@ -0,0 +1,36 @@
+# Tests for the config schema and the compiled settings
+
+import pytest
+
+import settings
+
+# A thresholds block from before the critical level (warn only)
+TWO_LEVEL_THRESHOLDS = {
+    "load_warn": 5.0,
+    "cpu_warn": 90,
+    "temp_warn": 85,
+    "mem_warn": 96,
+    "disk_warn": 90,
+}
+
+def test_two_level_thresholds_still_load():
+    config = settings.parse_config({"thresholds": TWO_LEVEL_THRESHOLDS})
+    levels = config.levels
+    assert (levels.load.warn, levels.load.critical) == (5.0, 5.0)
+    assert (levels.temp.warn, levels.temp.critical) == (85, 85)
+    assert (levels.memory.warn, levels.memory.critical) == (96, 96)
+    # A warn below the default critical keeps the default
+    assert levels.disk.critical == settings.DEFAULT_CONFIG["thresholds"]["disk_critical"]
+    assert config.thresholds.load_critical == 5.0
+
+def test_lone_critical_below_default_warn_lowers_warn():
+    level = settings.parse_config({"thresholds": {"temp_critical": 60}}).levels.temp
+    assert (level.warn, level.critical) == (60, 60)
+
+def test_explicit_critical_below_warn_is_rejected():
+    with pytest.raises(settings.ConfigError, match="temp_critical"):
+        settings.parse_config({"thresholds": {"temp_warn": 80, "temp_critical": 70}})
+
+def test_unknown_key_suggests_the_closest():
+    with pytest.raises(settings.ConfigError, match="did you mean thresholds.load_warn"):
+        settings.parse_config({"thresholds": {"laod_warn": 3}})